@@ -1,9 +1,21 @@
+import argparse
 import os
 import json
 
+import run_profiler
+from quality_profile import QualityProfile, print_profile, save_profile
+from roster_aggregates import AGGREGATES_FILENAME, RosterAggregates
+from student_validation import (EMAIL_KEYS, add_to_report, first_value, new_report, print_report, save_report,
+                                validate_records)
+from work_queue import load_outputs
+
 # Directory with your JSON files
 input_dir = r"C:\Users\ACER\AI TEACHING SYSTEM\GOOGLE SHEETS EXTRACTOR"
 
+# Shared queue filled by work_queue.py workers (None to read only the files below).
+# Spreadsheets finished there are taken from its cache instead of their file.
+work_queue_path = None
+
 # List of filenames to merge (make sure .json extension is included)
 filenames = [
     "Sheets Data Extractor 1xS5yt6c0H2YZmX4bYcq_gqdTFj7i4A_WkLgy9atOQas.json",
@@ -39,33 +51,73 @@ filenames = [
     "students_data_18M7Qzest9pTd0qX6F3P1d3cnmY1FhICogCTR-eXWd1g.json"
 ]
 
+parser = argparse.ArgumentParser(description="Merge the extracted roster JSON files into one list.")
+parser.add_argument("--profile-cpu", action="store_true",
+                    help="write per-stage cProfile reports (merge_cpu_profile.txt/.prof) to input_dir")
+parser.add_argument("--profile-mem", action="store_true",
+                    help="write a per-stage tracemalloc report (merge_memory_profile.txt) to input_dir")
+args = parser.parse_args()
+if args.profile_cpu or args.profile_mem:
+    run_profiler.start(args.profile_cpu, args.profile_mem)
+
 merged_data = []
+report = new_report()
+profile = QualityProfile()
+# Per-source counts; only sources whose rows changed move the totals
+aggregates = RosterAggregates(os.path.join(input_dir, AGGREGATES_FILENAME))
+queued_outputs = load_outputs(work_queue_path) if work_queue_path else {}
 
 for filename in filenames:
     file_path = os.path.join(input_dir, filename)
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                # Filter entries with non-blank "Email" or "Email Address"
-                filtered_entries = [
-                    entry for entry in data
-                    if (
-                        ("Email" in entry and entry["Email"] and str(entry["Email"]).strip())
-                        or ("Email Address" in entry and entry["Email Address"] and str(entry["Email Address"]).strip())
-                    )
-                ]
-                merged_data.extend(filtered_entries)
+        with run_profiler.stage("load"):
+            if filename in queued_outputs:
+                data = queued_outputs[filename]
             else:
-                print(f"⚠️ Warning: File {filename} does not contain a JSON list.")
+                with open(file_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+        if isinstance(data, list):
+            # Filter entries with a non-blank email ("Email", "EMAIL", "Email Address", ...)
+            with run_profiler.stage("filter"):
+                filtered_entries = [entry for entry in data if first_value(entry, EMAIL_KEYS) is not None]
+            # Validate and normalise student fields; rejected rows go to a report file
+            with run_profiler.stage("validate"):
+                kept, rejected, flagged = validate_records(filtered_entries)
+            add_to_report(report, len(filtered_entries), rejected, flagged, source=filename)
+            with run_profiler.stage("quality"):
+                profile.add_many(kept)
+            with run_profiler.stage("aggregates"):
+                aggregates.replace_source(filename, kept)
+            merged_data.extend(kept)
+        else:
+            print(f"⚠️ Warning: File {filename} does not contain a JSON list.")
     except Exception as e:
         print(f"⚠️ Could not read {filename}: {e}")
 
+for source in set(aggregates.sources) - set(filenames):
+    aggregates.remove_source(source)
+aggregates.save()
+
+report_path = os.path.join(input_dir, "ALL THE STUDENTS 03-09-2025 validation.json")
+save_report(report_path, report)
+profile_path = os.path.join(input_dir, "ALL THE STUDENTS 03-09-2025 quality.json")
+save_profile(profile_path, profile.report())
+
 # Output path for the merged file
 output_path = os.path.join(input_dir, "ALL THE STUDENTS 03-09-2025.json")
-with open(output_path, "w", encoding="utf-8") as f_out:
-    json.dump(merged_data, f_out, ensure_ascii=False, indent=2)
+run_profiler.checkpoint("before writing the merged file")
+with run_profiler.stage("write"):
+    with open(output_path, "w", encoding="utf-8") as f_out:
+        json.dump(merged_data, f_out, ensure_ascii=False, indent=2)
 
 print(f"\n✅ Merged {len(filenames)} files.")
 print(f"📄 Output contains {len(merged_data)} entries with non-blank email addresses.")
 print(f"💾 Saved to: {output_path}")
+print_report(report)
+print(f"📄 Validation report: {report_path}")
+print_profile(profile.report())
+print(f"📄 Quality report: {profile_path}")
+profiler = run_profiler.stop()
+if profiler is not None:
+    for path in profiler.save(input_dir, "merge_"):
+        print(f"📄 Profile: {path}")
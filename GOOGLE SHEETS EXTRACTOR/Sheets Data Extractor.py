@@ -3,6 +3,8 @@ import csv
 import json
 import os
 import re
+from io import StringIO
+from itertools import chain, islice
 
 target_headers = [
     'student name',
@@ -31,13 +33,11 @@ def extract_gid(url):
     else:
         raise ValueError(f"No gid found in URL: {url}")
 
-def find_header_row(csv_lines, target_headers, max_rows=15):
-    import csv
+def find_header_row(rows, target_headers, max_rows=15):
     best_row_num = None
     best_match_count = 0
 
-    for i in range(min(max_rows, len(csv_lines))):
-        row = next(csv.reader([csv_lines[i]]))
+    for i, row in enumerate(rows[:max_rows]):
         normalized_row = [h.strip().lower() for h in row]
 
         match_count = sum(1 for h in normalized_row if h in target_headers)
@@ -62,21 +62,25 @@ def fetch_worksheet_csv(spreadsheet_id, gid):
         return None
     return response.content.decode('utf-8')
 
-def extract_data_from_csv(csv_content, target_headers):
-    lines = csv_content.splitlines()
-    HEADER_ROW_NUMBER = find_header_row(lines, target_headers)
-    header_row = lines[HEADER_ROW_NUMBER - 1]
-    data_rows = lines[HEADER_ROW_NUMBER:]
-    import csv
-    raw_headers = next(csv.reader([header_row]))
-    reader = csv.DictReader(data_rows, fieldnames=raw_headers)
+def extract_data_from_csv(csv_content, target_headers, max_header_rows=15):
+    # Tokenize once: the first rows are buffered for header scoring and then
+    # fed to the extractor together with the rest of the reader, so quoted
+    # cells containing line breaks stay inside their row
+    reader = csv.reader(StringIO(csv_content))
+    lookahead = list(islice(reader, max_header_rows))
+    HEADER_ROW_NUMBER = find_header_row(lookahead, target_headers, max_header_rows)
+    raw_headers = lookahead[HEADER_ROW_NUMBER - 1]
+
+    # Column index per output key; a repeated header keeps its last column
+    columns = {}
+    for i, key in enumerate(raw_headers):
+        if safe_normalize(key) in target_headers:
+            columns[key.strip()] = i
+    columns = list(columns.items())
 
     extracted = []
-    for row in reader:
-        entry = {}
-        for key in row:
-            if safe_normalize(key) in target_headers:
-                entry[key.strip()] = (row[key] or '').strip()
+    for row in chain(lookahead[HEADER_ROW_NUMBER:], reader):
+        entry = {key: (row[i] if i < len(row) else '').strip() for key, i in columns}
         if any(entry.values()):
             extracted.append(entry)
     return extracted
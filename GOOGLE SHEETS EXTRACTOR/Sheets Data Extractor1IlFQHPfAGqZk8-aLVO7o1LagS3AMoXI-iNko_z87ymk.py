@@ -66,16 +66,16 @@ for url in worksheet_urls:
     headers = rows[header_row_index]
     print(f"   → Detected headers: {headers}")
 
+    # Use the parsed rows directly; re-joining them with "," and parsing again
+    # split any cell that contained a quoted comma
     data_rows = rows[header_row_index + 1:]
-    filtered_csv_data = "\n".join([",".join(row) for row in data_rows])
-    csv_stream = StringIO(filtered_csv_data)
-    dict_reader = csv.DictReader(csv_stream, fieldnames=headers)
+    target_keys = set(normalize_header(h) for h in TARGET_HEADERS)
 
     extracted_rows = []
-    for row in dict_reader:
+    for row in data_rows:
         clean_row = {}
-        for k, v in row.items():
-            if normalize_header(k) in [normalize_header(h) for h in TARGET_HEADERS]:
+        for k, v in dict(zip(headers, row)).items():
+            if normalize_header(k) in target_keys:
                 if k and v:
                     clean_row[k.strip()] = v.strip()
         if clean_row:
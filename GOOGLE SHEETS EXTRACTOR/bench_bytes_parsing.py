@@ -0,0 +1,91 @@
+import argparse
+import csv
+import time
+import tracemalloc
+from io import StringIO
+
+from fake_sheets_server import ROSTER_HEADERS, synthetic_sheet
+from csv_tokenizer import iter_projected_rows, read_rows
+from sheets_engine import compile_header_plan, normalize
+
+# CPU time per MB and allocation peak for parsing an export body:
+# decoded text vs raw response bytes, with and without column projection.
+
+TARGETS = set(normalize(h) for h in ROSTER_HEADERS)
+
+
+def rejoin_path(body):
+    # Decode, parse, re-join with "," and parse again (the 1IlFQ/1wWmit scripts)
+    rows = list(csv.reader(StringIO(body.decode("utf-8", errors="ignore"))))
+    headers = rows[4]
+    joined = "\n".join([",".join(row) for row in rows[5:]])
+    kept = []
+    for row in csv.DictReader(StringIO(joined), fieldnames=headers):
+        clean = {k.strip(): v.strip() for k, v in row.items() if normalize(k) in TARGETS and k and v}
+        if clean:
+            kept.append(clean)
+    return kept
+
+
+def decoded_reader_path(body):
+    rows = csv.reader(StringIO(body.decode("utf-8")))
+    for _ in range(4):
+        next(rows)
+    plan = compile_header_plan(next(rows), TARGETS)
+    return [{key: row[i].strip() for i, key in plan if row[i].strip()} for row in rows]
+
+
+def _projected(data):
+    head, pos = read_rows(data, 5)
+    plan = compile_header_plan(head[4], TARGETS)
+    columns = [i for i, _ in plan]
+    return [{key: row[i].strip() for i, key in plan if row[i].strip()} for row in iter_projected_rows(data, columns, pos)]
+
+
+def decoded_projected_path(body):
+    return _projected(body.decode("utf-8"))
+
+
+def bytes_projected_path(body):
+    return _projected(body)
+
+
+def measure(fn, body, repeat):
+    best_cpu = None
+    for _ in range(repeat):
+        started = time.process_time()
+        result = fn(body)
+        elapsed = time.process_time() - started
+        best_cpu = elapsed if best_cpu is None else min(best_cpu, elapsed)
+
+    tracemalloc.start()
+    fn(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best_cpu, peak, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark text vs bytes-level CSV parsing.")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--columns", type=int, default=120)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    body = synthetic_sheet(args.rows, args.columns).encode("utf-8")
+    size_mb = len(body) / 1e6
+    print(f"Export body: {args.rows} rows x {args.columns} columns ({size_mb:.1f} MB)")
+
+    paths = [
+        ("decode + re-join + DictReader", rejoin_path),
+        ("decode + csv.reader", decoded_reader_path),
+        ("decode + projected tokenizer", decoded_projected_path),
+        ("bytes + projected tokenizer", bytes_projected_path),
+    ]
+    for name, fn in paths:
+        cpu, peak, rows = measure(fn, body, args.repeat)
+        print(f"{name:32s} {cpu * 1000 / size_mb:8.1f} ms CPU/MB  peak {peak / 1e6:7.2f} MB  ({rows} rows)")
+
+
+if __name__ == "__main__":
+    main()
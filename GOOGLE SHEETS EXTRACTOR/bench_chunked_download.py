@@ -0,0 +1,68 @@
+import argparse
+import time
+
+import requests
+
+import sheets_engine
+from fake_sheets_server import synthetic_sheet
+from fake_sheets_server import FakeSheetsServer
+
+# Single sequential export vs parallel row-range chunks against the local fake
+# server with a per-connection bandwidth cap (a stand-in for a slow link to the
+# Sheets export endpoint).
+
+SPREADSHEET_ID = "BENCH"
+GID = "1"
+
+
+def run_once(server, options):
+    sheets_engine.SHEETS_BASE_URL = server.url
+    options = dict(sheets_engine.DEFAULT_OPTIONS, **options)
+    stats = sheets_engine.new_run_stats()
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(10, options["chunk_workers"]))
+    session.mount("http://", adapter)
+
+    started = time.perf_counter()
+    csv_content = sheets_engine.fetch_worksheet_csv(session, SPREADSHEET_ID, GID, stats, options)
+    download = time.perf_counter() - started
+    records = sheets_engine.extract_from_csv(csv_content, sheets_engine.SCHEMAS["roster"], stats)
+    return download, time.perf_counter() - started, records, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunked parallel download against a throttled server.")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--columns", type=int, default=40)
+    parser.add_argument("--bandwidth", type=int, default=2_000_000, help="bytes/s per connection")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--chunk-rows", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="*", default=[2, 4, 8])
+    args = parser.parse_args()
+
+    sheet = synthetic_sheet(args.rows, args.columns)
+    size_mb = len(sheet.encode("utf-8")) / 1e6
+    print(f"Worksheet: {args.rows} rows x {args.columns} columns ({size_mb:.1f} MB), "
+          f"{args.bandwidth / 1e6:.1f} MB/s per connection, {args.latency * 1000:.0f} ms latency")
+
+    workbooks = {SPREADSHEET_ID: {GID: sheet}}
+    with FakeSheetsServer(workbooks, latency=args.latency, bandwidth=args.bandwidth) as server:
+        runs = [("single download", {"chunk_rows": 0})]
+        runs += [(f"chunked x{w}", {"chunk_rows": args.chunk_rows, "chunk_workers": w}) for w in args.workers]
+
+        baseline = None
+        expected = None
+        for name, options in runs:
+            download, total, records, stats = run_once(server, options)
+            if expected is None:
+                expected = records
+            elif records != expected:
+                print(f"⚠️ {name} produced different records than the single download")
+            baseline = baseline or total
+            requests_made = stats["chunk_requests"] or 1
+            print(f"{name:18s} download {download:6.2f}s  total {total:6.2f}s  "
+                  f"{size_mb / download:5.1f} MB/s  {requests_made:3d} requests  x{baseline / total:4.1f}")
+
+
+if __name__ == "__main__":
+    main()
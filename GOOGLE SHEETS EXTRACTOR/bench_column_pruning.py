@@ -0,0 +1,97 @@
+import argparse
+import csv
+import time
+from io import StringIO
+
+from csv_tokenizer import iter_projected_rows, read_rows
+from fake_sheets_server import ROSTER_HEADERS, synthetic_sheet
+from sheets_engine import SCHEMAS, compile_header_plan, new_run_stats, extract_from_csv, normalize
+
+# Compares full tokenization against column-projected tokenization on a
+# synthetic wide class sheet (300 columns by default, only ~10 of them wanted).
+
+
+def zip_path(text, target_headers):
+    # Path used by most per-spreadsheet scripts
+    rows = list(csv.reader(StringIO(text)))
+    header = rows[4]
+    kept = []
+    for row in rows[5:]:
+        entry = dict(zip(header, row))
+        filtered = {
+            k.strip(): entry.get(k, "").strip()
+            for k in header
+            if normalize(k) in target_headers and entry.get(k, "").strip()
+        }
+        if filtered:
+            kept.append(filtered)
+    return kept
+
+
+def full_tokenize_path(text, target_headers):
+    rows = csv.reader(StringIO(text))
+    for _ in range(4):
+        next(rows)
+    plan = compile_header_plan(next(rows), target_headers)
+    kept = []
+    for row in rows:
+        entry = {key: row[i].strip() for i, key in plan if row[i].strip()}
+        if entry:
+            kept.append(entry)
+    return kept
+
+
+def projected_path(text, target_headers):
+    head, pos = read_rows(text, 5)
+    plan = compile_header_plan(head[4], target_headers)
+    kept = []
+    for row in iter_projected_rows(text, [i for i, _ in plan], pos):
+        entry = {key: row[i].strip() for i, key in plan if row[i].strip()}
+        if entry:
+            kept.append(entry)
+    return kept
+
+
+def engine_path(text, target_headers):
+    return extract_from_csv(text, SCHEMAS["roster"], new_run_stats())
+
+
+def timed(fn, text, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark column pruning on a wide synthetic sheet.")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--columns", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text = synthetic_sheet(args.rows, args.columns)
+    targets = set(normalize(h) for h in ROSTER_HEADERS)
+    size_mb = len(text.encode("utf-8")) / 1e6
+    print(f"Synthetic sheet: {args.rows} rows x {args.columns} columns ({size_mb:.1f} MB)")
+
+    paths = [
+        ("csv.reader + dict(zip)", lambda t: zip_path(t, targets)),
+        ("csv.reader + header plan", lambda t: full_tokenize_path(t, targets)),
+        ("projected tokenizer", lambda t: projected_path(t, targets)),
+        ("engine (projected + filters)", lambda t: engine_path(t, targets)),
+    ]
+    baseline = None
+    for name, fn in paths:
+        elapsed, result = timed(fn, text, args.repeat)
+        baseline = baseline or elapsed
+        print(f"{name:30s} {elapsed * 1000:8.1f} ms  {args.rows / elapsed:10.0f} rows/s  "
+              f"{size_mb / elapsed:6.1f} MB/s  x{baseline / elapsed:4.1f}  ({len(result)} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from external_dedupe import dedupe, dedupe_key
+
+# Disk-backed de-duplication at archive sizes that do not fit in memory,
+# on synthetic roster rows (about half are repeats of an earlier student,
+# as when several terms of rosters are merged). Rows are generated on the
+# fly, so the only large memory is what the dedupe pass itself holds; peak
+# RSS is reported where the platform has it. --baseline also times the plain
+# in-memory dict for comparison, when it fits.
+
+NATIONALITIES = ["CHINA", "SAUDI ARABIA", "MALAYSIA", "YEMEN", "LIBYA", "JAPAN", "KOREA", "IRAQ"]
+
+
+def synthetic_records(count, seed=39):
+    rng = random.Random(seed)
+    students = max(1, count * 2 // 3)
+    for n in range(count):
+        k = rng.randrange(students)
+        yield {
+            "Student ID": f"2025JB{k % 100000:05d}",
+            "Student Name": f"STUDENT {k}",
+            "Gender": "MF"[k % 2],
+            "Nationality": NATIONALITIES[k % len(NATIONALITIES)],
+            "Email": rng.choice([f"{1000000 + k}@qq.com", f" {1000000 + k}@QQ.COM"]),
+            "_worksheet_gid": str(n % 40),
+        }
+
+
+def in_memory(records, output_path):
+    unique = {}
+    for record in records:
+        key = dedupe_key(record)
+        if key is not None and key not in unique:
+            unique[key] = record
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(list(unique.values()), f, ensure_ascii=False)
+    return len(unique)
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark external-sort de-duplication.")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--memory-mb", type=float, default=256)
+    parser.add_argument("--baseline", action="store_true", help="also time the in-memory dict (needs the RAM)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output = os.path.join(temp_dir, "deduplicated.json")
+        started = time.perf_counter()
+        stats = dedupe(synthetic_records(args.rows), output, args.memory_mb, temp_dir=temp_dir)
+        elapsed = time.perf_counter() - started
+        size_mb = os.path.getsize(output) / 1e6
+        rss = peak_rss_mb()
+        print(f"external  {elapsed:8.1f} s  {args.rows / elapsed:9.0f} rows/s  {stats['rows_out']} unique  "
+              f"{stats['runs']} runs, {stats['merge_passes']} merge passes  {size_mb:.0f} MB out"
+              + (f"  peak RSS {rss:.0f} MB (budget {args.memory_mb:g} MB)" if rss else ""))
+
+        if args.baseline:
+            started = time.perf_counter()
+            unique = in_memory(synthetic_records(args.rows), output)
+            elapsed = time.perf_counter() - started
+            rss = peak_rss_mb()
+            print(f"in memory {elapsed:8.1f} s  {args.rows / elapsed:9.0f} rows/s  {unique} unique"
+                  + (f"  peak RSS {rss:.0f} MB" if rss else ""))
+
+
+if __name__ == "__main__":
+    main()
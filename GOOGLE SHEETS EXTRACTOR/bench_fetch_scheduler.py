@@ -0,0 +1,65 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from fake_sheets_server import synthetic_sheet
+from fake_sheets_server import FakeSheetsServer
+from fetch_scheduler import FetchScheduler
+
+# Worksheet downloads against the fake server with a quota: a request rate
+# (429 + Retry-After beyond it) and a cap on requests in progress (503).
+# Plain fixed-concurrency fetching loses every refused worksheet; the
+# scheduler retries them, finds the concurrency the server tolerates and,
+# when told the quota (--rate), stays under it so nothing is refused at all.
+
+
+def fetch_all(get, urls, workers):
+    def fetch(url):
+        try:
+            return get(url, timeout=60).status_code == 200
+        except requests.RequestException:
+            return False
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(fetch, urls))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the adaptive fetch scheduler against a rate-limited server.")
+    parser.add_argument("--worksheets", type=int, default=120)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--quota", type=float, default=20.0, help="server requests per second")
+    parser.add_argument("--max-concurrent", type=int, default=6, help="server requests in progress")
+    parser.add_argument("--latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    sheet = synthetic_sheet(200, 30)
+    workbooks = {"S": {str(gid): sheet for gid in range(args.worksheets)}}
+    scenarios = [
+        ("direct", None),
+        ("scheduler (AIMD)", lambda: FetchScheduler()),
+        (f"scheduler (rate {args.quota:g}/s)", lambda: FetchScheduler(rate=args.quota, burst=1)),
+    ]
+    for name, make_scheduler in scenarios:
+        with FakeSheetsServer(workbooks, latency=args.latency, rate_limit=args.quota,
+                              max_concurrent=args.max_concurrent) as server:
+            urls = [f"{server.url}/spreadsheets/d/S/export?format=csv&gid={gid}" for gid in range(args.worksheets)]
+            session = requests.Session()
+            scheduler = make_scheduler() if make_scheduler else None
+            get = scheduler.session(session).get if scheduler else session.get
+            started = time.perf_counter()
+            fetched = fetch_all(get, urls, args.workers)
+            elapsed = time.perf_counter() - started
+            refused = server.refused
+            line = (f"{name:24s} {elapsed:6.2f} s  {fetched / elapsed:6.1f} worksheets/s  "
+                    f"{fetched}/{args.worksheets} fetched  429: {refused[429]:3d}  503: {refused[503]:3d}")
+            if scheduler:
+                host = next(iter(scheduler.summary()["hosts"].values()))
+                line += f"  limit {host['limit']:.1f}, peak {host['peak_in_flight']} in flight"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
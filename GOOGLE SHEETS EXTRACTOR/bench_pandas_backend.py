@@ -0,0 +1,81 @@
+import argparse
+import csv
+import random
+import time
+from io import StringIO
+
+from fake_sheets_server import synthetic_sheet
+from pandas_backend import PANDAS_MIN_ROWS, available
+from sheets_engine import SCHEMAS, extract_from_csv, new_run_stats
+
+# Pure-Python vs pandas body extraction through the engine, across sheet sizes.
+# The crossover is what PANDAS_MIN_ROWS ("auto" backend) is tuned from.
+# Both backends must return the same records, on rectangular synthetic
+# sheets and on ragged ones (short, blank and overlong rows).
+
+RAGGED_SHEETS = 200
+
+
+def ragged_sheet(seed, rows=40):
+    rng = random.Random(seed)
+    header = ["No.", "Student ID", "Student Name", "Gender", "Nationality", "Email", "Visa", "Remark"]
+    out = StringIO()
+    writer = csv.writer(out, lineterminator="\r\n")
+    writer.writerow(header)
+    for n in range(rng.randint(1, rows)):
+        width = rng.choice([0, 1, 3, len(header), len(header), len(header) + 2])
+        writer.writerow([rng.choice(["", str(n), " x ", f"s{n}@example.edu.my"]) for _ in range(width)] or [""])
+    return out.getvalue().encode("utf-8")
+
+
+def ragged_mismatches(sheets=RAGGED_SHEETS):
+    # Seeds whose pandas records differ from the pure-Python ones
+    return [
+        seed for seed in range(sheets)
+        if timed(ragged_sheet(seed), "pandas", 1)[1] != timed(ragged_sheet(seed), "python", 1)[1]
+    ]
+
+
+def timed(body, backend, repeat):
+    best = None
+    records = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        records = extract_from_csv(body, SCHEMAS["roster"], new_run_stats(), backend=backend)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pandas extraction backend against pure Python.")
+    parser.add_argument("--rows", type=int, nargs="*", default=[200, 1000, 5000, 20000, 50000])
+    parser.add_argument("--columns", type=int, nargs="*", default=[20, 120])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if not available():
+        print("⚠️ pandas is not installed; nothing to compare")
+        return
+
+    mismatches = ragged_mismatches()
+    if mismatches:
+        print(f"⚠️ pandas records differ from the pure-Python path on ragged sheets (seeds {mismatches[:10]})")
+    else:
+        print(f"✅ pandas matches the pure-Python path on {RAGGED_SHEETS} ragged sheets")
+    print(f"auto switches to pandas at {PANDAS_MIN_ROWS} rows")
+    for columns in args.columns:
+        for rows in args.rows:
+            body = synthetic_sheet(rows, columns).encode("utf-8")
+            size_mb = len(body) / 1e6
+            python_time, expected = timed(body, "python", args.repeat)
+            pandas_time, records = timed(body, "pandas", args.repeat)
+            if records != expected:
+                print(f"⚠️ {rows} x {columns}: pandas records differ from the pure-Python path")
+            print(f"{rows:6d} rows x {columns:3d} cols ({size_mb:6.2f} MB)  "
+                  f"python {python_time * 1000:8.1f} ms  pandas {pandas_time * 1000:8.1f} ms  "
+                  f"x{python_time / pandas_time:4.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+from io import StringIO
+
+from fake_sheets_server import save_workbooks
+from pandas_backend import available as pandas_available
+from sheets_engine import HEADER_SCAN_ROWS, SCHEMAS, new_run_stats, normalize, parse_worksheet
+
+# Parsing benchmark over a generated corpus of realistic class sheets.
+# Each sheet varies the way the real rosters do: title/notes rows above the
+# header (sometimes past the 15-row scan of the older scripts), several
+# class blocks in one tab each with its own header row, "Email" or
+# "Email Address", 10-200 attendance columns, blank separator rows,
+# quoted multi-line and comma remarks, CJK names and rows without an email.
+# Every extraction path in the tree runs over the same corpus:
+#   dictreader  csv.DictReader from the detected header row on
+#   rejoin      parse, re-join rows with "," and parse again with DictReader
+#               (the 1IlFQ/1wWmit scripts before the quoted-comma fix)
+#   zip         dict(zip(header, row)) after a 15-row header scan (most
+#               per-spreadsheet scripts)
+#   multiblock  substring header matching that restarts at every header
+#               row (1JHeB3 script)
+#   engine      sheets_engine.parse_worksheet on the response bytes, pure
+#               Python and, when installed, pandas
+# Rows/s and MB/s are over the corpus input (data rows and bytes), so the
+# paths compare on equal terms; "kept" differs because the paths filter
+# differently (the engine drops rows without an email, zip misses headers
+# below row 15). Peak memory is tracemalloc's peak for the largest sheet.
+# Each run appends one line per path to bench_results.jsonl with the corpus
+# settings and git revision, and is compared with the last run of the same
+# path on the same corpus.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILENAME = "bench_results.jsonl"
+REGRESSION_THRESHOLD = 0.10
+
+LATIN_NAMES = ["AHMED ALI", "WEI QIANDI", "NUR AISYAH", "MOHAMMED SALEH", "KIM MINJI", "SARA YOUSEF",
+               "TANAKA HARUTO", "OMAR HASSAN", "LIM JIA HUI", "FATIMA ZAHRA"]
+CJK_NAMES = ["王伟", "李娜", "张敏", "刘洋", "陈静", "杨磊", "赵丽", "黄强", "周杰", "吴芳"]
+NATIONALITIES = ["CHINA", "YEMEN", "LIBYA", "SAUDI ARABIA", "MALAYSIA", "KOREA", "JAPAN", "IRAQ"]
+REMARKS = ["", "", "", "", "N", "REPEAT", "Moved to Level 3, from 12/08", "Absent 3 days\nMedical letter"]
+NOTES = ["INTENSIVE ENGLISH PROGRAMME", "CLASS SCHEDULE 9AM - 1PM", "TEACHER: MS. TAN", "ROOM 4.12",
+         "Term 3 2025", "Please update weekly"]
+HEADER_OFFSETS = [0, 2, 3, 4, 4, 4, 6, 9, 12, 17]
+ATTENDANCE_WIDTHS = [10, 30, 60, 120, 200]
+TARGETS = set(normalize(h) for h in SCHEMAS["roster"]["target_headers"])
+
+
+def class_sheet(rng, rows):
+    # One worksheet's CSV text and its number of student rows
+    email_header = rng.choice(["Email", "Email Address"])
+    attendance = [f"Day {i + 1}" for i in range(rng.choice(ATTENDANCE_WIDTHS))]
+    header = ["No.", "Student ID", "Student Name", "Gender", "Nationality", email_header, "Visa",
+              "Current Location", "Remark", rng.choice(["PASS / REPEAT", "PASS / FAIL / REPEAT"])] + attendance
+    width = len(header)
+    out = StringIO()
+    writer = csv.writer(out, lineterminator="\r\n")
+    for _ in range(rng.choice(HEADER_OFFSETS)):
+        writer.writerow(([rng.choice(NOTES)] if rng.random() < 0.6 else [""]) + [""] * (width - 1))
+
+    blocks = rng.choice([1, 1, 1, 2, 3])
+    sizes = [rows // blocks + (1 if b < rows % blocks else 0) for b in range(blocks)]
+    n = 0
+    for b, size in enumerate(sizes):
+        if b:
+            writer.writerow([""] * width)
+            writer.writerow([f"CLASS {chr(65 + b)} (AFTERNOON)"] + [""] * (width - 1))
+        writer.writerow(header)
+        for i in range(size):
+            if i and rng.random() < 0.03:
+                writer.writerow([""] * width)
+            n += 1
+            name = rng.choice(CJK_NAMES) if rng.random() < 0.2 else f"{rng.choice(LATIN_NAMES)} {n}"
+            email = f"student{n}@example.edu.my" if rng.random() < 0.95 else ""
+            writer.writerow([
+                str(i + 1), f"2025KL{n:05d}", name, rng.choice("MF"), rng.choice(NATIONALITIES), email,
+                "SOCIAL", "HC", rng.choice(REMARKS), rng.choice(["PASS", "REPEAT", ""]),
+            ] + [rng.choice(["1", "0", "PRESENT", "ABSENT", ""]) for _ in attendance])
+    return out.getvalue(), sum(sizes)
+
+
+def generate_corpus(sheets=40, rows=300, seed=50):
+    rng = random.Random(seed)
+    corpus = []
+    for s in range(sheets):
+        text, data_rows = class_sheet(rng, rng.randint(max(1, rows // 2), rows * 3 // 2))
+        corpus.append({"gid": str(1000 + s), "body": text.encode("utf-8"), "data_rows": data_rows})
+    return corpus
+
+
+def _find_header(rows, scan, matches):
+    for i, row in enumerate(rows[:scan]):
+        if matches([normalize(cell) for cell in row]):
+            return i
+    return -1
+
+
+def _three_hits(cells):
+    return sum(1 for h in TARGETS if h in cells) >= 3
+
+
+def dictreader_path(body):
+    text = body.decode("utf-8")
+    head = [row for _, row in zip(range(HEADER_SCAN_ROWS), csv.reader(StringIO(text)))]
+    index = _find_header(head, HEADER_SCAN_ROWS, _three_hits)
+    if index == -1:
+        return []
+    rows = csv.DictReader(StringIO(text), fieldnames=head[index], restval="")
+    for _ in range(index + 1):
+        next(rows)
+    kept = []
+    for row in rows:
+        clean = {k.strip(): v.strip() for k, v in row.items() if k and v and normalize(k) in TARGETS}
+        if clean:
+            kept.append(clean)
+    return kept
+
+
+def rejoin_path(body):
+    rows = list(csv.reader(StringIO(body.decode("utf-8", errors="ignore"))))
+    index = _find_header(rows, HEADER_SCAN_ROWS, _three_hits)
+    if index == -1:
+        return []
+    headers = rows[index]
+    joined = "\n".join([",".join(row) for row in rows[index + 1:]])
+    kept = []
+    for row in csv.DictReader(StringIO(joined), fieldnames=headers):
+        clean = {k.strip(): v.strip() for k, v in row.items() if k and v and normalize(k) in TARGETS}
+        if clean:
+            kept.append(clean)
+    return kept
+
+
+def zip_path(body):
+    rows = list(csv.reader(StringIO(body.decode("utf-8"))))
+    index = _find_header(rows, 15, lambda cells: any(h in cells for h in TARGETS))
+    if index == -1:
+        return []
+    header = rows[index]
+    kept = []
+    for row in rows[index + 1:]:
+        if len(row) < len(header):
+            row += [""] * (len(header) - len(row))
+        entry = dict(zip(header, row))
+        filtered = {
+            k.strip(): entry.get(k, "").strip()
+            for k in header
+            if normalize(k) in TARGETS and entry.get(k, "").strip()
+        }
+        if filtered:
+            kept.append(filtered)
+    return kept
+
+
+def _substring_match(cell):
+    return any(h in cell for h in TARGETS)
+
+
+def multiblock_path(body):
+    rows = list(csv.reader(StringIO(body.decode("utf-8"))))
+    kept = []
+    i = 0
+    while i < len(rows):
+        if not any(_substring_match(normalize(cell)) for cell in rows[i]):
+            i += 1
+            continue
+        header = rows[i]
+        i += 1
+        while i < len(rows) and not any(_substring_match(normalize(cell)) for cell in rows[i]):
+            row = rows[i] + [""] * (len(header) - len(rows[i]))
+            entry = dict(zip(header, row))
+            filtered = {
+                k.strip(): entry.get(k, "").strip()
+                for k in header
+                if _substring_match(normalize(k)) and entry.get(k, "").strip()
+            }
+            if filtered:
+                kept.append(filtered)
+            i += 1
+    return kept
+
+
+def engine_path(backend):
+    def extract(body):
+        try:
+            return parse_worksheet(body, SCHEMAS["roster"], new_run_stats(), backend=backend)[0]
+        except ValueError:
+            return []
+    return extract
+
+
+def extraction_paths():
+    paths = [
+        ("dictreader", dictreader_path),
+        ("rejoin", rejoin_path),
+        ("zip", zip_path),
+        ("multiblock", multiblock_path),
+        ("engine", engine_path("python")),
+    ]
+    if pandas_available():
+        paths.append(("engine (pandas)", engine_path("pandas")))
+    return paths
+
+
+def measure(fn, corpus, repeat):
+    best = None
+    kept = missed = 0
+    for _ in range(repeat):
+        kept = missed = 0
+        started = time.perf_counter()
+        for sheet in corpus:
+            records = fn(sheet["body"])
+            kept += len(records)
+            missed += not records
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    largest = max(corpus, key=lambda sheet: len(sheet["body"]))
+    tracemalloc.start()
+    fn(largest["body"])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, kept, missed, peak
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def last_results(path, corpus_settings):
+    # Latest stored result per path name for the same corpus
+    last = {}
+    if not os.path.exists(path):
+        return last
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if result.get("corpus") == corpus_settings:
+                last[result["path"]] = result
+    return last
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every extraction path on a synthetic roster corpus.")
+    parser.add_argument("--sheets", type=int, default=40)
+    parser.add_argument("--rows", type=int, default=300, help="average student rows per sheet")
+    parser.add_argument("--seed", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="*", help="path names to run (default: all)")
+    parser.add_argument("--results", default=os.path.join(SCRIPT_DIR, RESULTS_FILENAME))
+    parser.add_argument("--no-save", dest="save", action="store_false", help="do not append to the results file")
+    parser.add_argument("--save-corpus", metavar="DIR",
+                        help="also write the corpus as DIR/BENCH/{gid}.csv for fake_sheets_server")
+    args = parser.parse_args()
+
+    corpus_settings = {"sheets": args.sheets, "rows": args.rows, "seed": args.seed}
+    corpus = generate_corpus(args.sheets, args.rows, args.seed)
+    size_mb = sum(len(sheet["body"]) for sheet in corpus) / 1e6
+    data_rows = sum(sheet["data_rows"] for sheet in corpus)
+    print(f"📊 Corpus: {len(corpus)} sheets, {data_rows} student rows, {size_mb:.1f} MB")
+    if args.save_corpus:
+        save_workbooks({"BENCH": {sheet["gid"]: sheet["body"].decode("utf-8") for sheet in corpus}}, args.save_corpus)
+        print(f"💾 Corpus saved to: {os.path.join(args.save_corpus, 'BENCH')}")
+
+    previous = last_results(args.results, corpus_settings)
+    revision = git_revision()
+    results = []
+    for name, fn in extraction_paths():
+        if args.only and name not in args.only:
+            continue
+        elapsed, kept, missed, peak = measure(fn, corpus, args.repeat)
+        result = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "revision": revision, "python": platform.python_version(),
+            "corpus": corpus_settings, "path": name, "seconds": round(elapsed, 4),
+            "rows_per_second": round(data_rows / elapsed), "mb_per_second": round(size_mb / elapsed, 2),
+            "peak_mb": round(peak / 1e6, 2), "kept": kept, "sheets_missed": missed,
+        }
+        results.append(result)
+        line = (f"{name:16s} {result['rows_per_second']:9,} rows/s {result['mb_per_second']:7.2f} MB/s  "
+                f"peak {result['peak_mb']:6.2f} MB  kept {kept:6d}  missed {missed:3d} sheets")
+        before = previous.get(name)
+        if before:
+            change = result["rows_per_second"] / before["rows_per_second"] - 1
+            flag = "⚠️ " if change < -REGRESSION_THRESHOLD else ""
+            line += f"  {flag}{change:+.0%} vs {before.get('revision') or before['time']}"
+        print(line)
+
+    if args.save and results:
+        with open(args.results, "a", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+        print(f"📄 Results appended to: {args.results}")
+
+
+if __name__ == "__main__":
+    main()
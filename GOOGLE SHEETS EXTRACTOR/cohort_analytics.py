@@ -0,0 +1,250 @@
+import argparse
+import glob
+import json
+import os
+import re
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from quality_profile import iter_json_array
+from roster_aggregates import label, nationality_label
+from student_validation import EMAIL_KEYS, resolve_keys
+
+# Trends across the dated "ALL THE STUDENTS DD-MM-YYYY.json" snapshots.
+# Each snapshot is streamed once into a compact summary (unique students per
+# nationality, per level, outcome counts per nationality, and email -> level
+# for the few students with a CIEP level). Summaries are cached in
+# cohort_cache.json keyed by file size and mtime, so queries never re-parse a
+# historical snapshot. A query lays the cached summaries out as a
+# snapshots x values matrix over the union vocabulary and answers with numpy
+# arithmetic (differences, ratios, transition counts).
+#
+# Outcomes come from the "PASS / REPEAT" style columns, falling back to the
+# Remark column (REPEAT, R1, R1-INC -> repeat; F-... -> fail; N... -> new).
+# Snapshots are raw extractor output, so fields are matched by normalised
+# header ("EMAIL", "NATIONALITY") and nationalities are folded through
+# student_dedupe's alias table before they are counted. Summaries need only
+# the standard library; the queries need numpy.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_PATTERN = "ALL THE STUDENTS *.json"
+SNAPSHOT_DATE = re.compile(r"(\d{2})-(\d{2})-(\d{4})")
+CACHE_FILENAME = "cohort_cache.json"
+CACHE_VERSION = 3
+
+NATIONALITY_KEYS = ["Nationality"]
+LEVEL_KEYS = ["Current CIEP Level"]
+REMARK_KEYS = ["Remark"]
+OUTCOMES = ["pass", "repeat", "fail", "new"]
+
+_OUTCOME_COLUMN = re.compile(r"^pass\s*/")
+_REMARK_OUTCOMES = [
+    (re.compile(r"^(REPEAT|R\d)"), "repeat"),
+    (re.compile(r"^F-"), "fail"),
+    (re.compile(r"^N\b"), "new"),
+]
+_RESULT_OUTCOMES = [
+    (re.compile(r"^PASS$"), "pass"),
+    (re.compile(r"^REPEAT"), "repeat"),
+    (re.compile(r"^(FAIL|F-)"), "fail"),
+]
+
+
+def snapshot_date(path):
+    match = SNAPSHOT_DATE.search(os.path.basename(path))
+    if not match:
+        return None
+    day, month, year = match.groups()
+    return datetime(int(year), int(month), int(day)).date().isoformat()
+
+
+def find_snapshots(directory):
+    dated = [(snapshot_date(p), p) for p in glob.glob(os.path.join(directory, SNAPSHOT_PATTERN))]
+    return [path for date, path in sorted(d for d in dated if d[0])]
+
+
+def _first(record, keys, labeller=label):
+    for key in resolve_keys(record, keys):
+        value = record.get(key)
+        if value is not None and str(value).strip():
+            return labeller(value)
+    return None
+
+
+def outcome(record):
+    for key, value in record.items():
+        if _OUTCOME_COLUMN.match(" ".join(key.split()).lower()) and value:
+            text = label(value)
+            for pattern, name in _RESULT_OUTCOMES:
+                if pattern.match(text):
+                    return name
+    text = _first(record, REMARK_KEYS)
+    if text:
+        for pattern, name in _REMARK_OUTCOMES:
+            if pattern.match(text):
+                return name
+    return None
+
+
+def _bump(table, key, count=1):
+    table[key] = table.get(key, 0) + count
+
+
+def summarize_snapshot(path):
+    # One streaming pass; students are counted once per snapshot, by email
+    seen = set()
+    summary = {"students": 0, "nationality": {}, "level": {}, "outcomes": {}, "levels_by_email": {}}
+    for record in iter_json_array(path):
+        email = _first(record, EMAIL_KEYS)
+        if not email or email in seen:
+            continue
+        seen.add(email)
+        summary["students"] += 1
+        nationality = _first(record, NATIONALITY_KEYS, nationality_label) or "(blank)"
+        _bump(summary["nationality"], nationality)
+        level = _first(record, LEVEL_KEYS)
+        if level:
+            _bump(summary["level"], level)
+            summary["levels_by_email"][email] = level
+        result = outcome(record)
+        if result:
+            _bump(summary["outcomes"].setdefault(nationality, {}), result)
+    return summary
+
+
+class SnapshotCache:
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored.get("version") == CACHE_VERSION:
+                self.entries = stored["snapshots"]
+
+    def summary(self, path):
+        stat = os.stat(path)
+        key = os.path.basename(path)
+        entry = self.entries.get(key)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["summary"]
+        summary = summarize_snapshot(path)
+        self.entries[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "summary": summary}
+        self.dirty = True
+        return summary
+
+    def save(self):
+        if not self.dirty:
+            return
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "snapshots": self.entries}, f, ensure_ascii=False)
+        self.dirty = False
+
+
+class Cohort:
+    def __init__(self, paths, cache):
+        self.dates = [snapshot_date(p) for p in paths]
+        self.summaries = [cache.summary(p) for p in paths]
+
+    def matrix(self, dimension):
+        # snapshots x values over the union vocabulary of every snapshot
+        vocabulary = sorted(set().union(*(s[dimension] for s in self.summaries)))
+        index = {value: i for i, value in enumerate(vocabulary)}
+        counts = np.zeros((len(self.summaries), len(vocabulary)), dtype=np.int64)
+        for row, summary in enumerate(self.summaries):
+            for value, count in summary[dimension].items():
+                counts[row, index[value]] = count
+        return vocabulary, counts
+
+    def outcome_tensor(self):
+        # snapshots x nationalities x outcomes
+        vocabulary = sorted(set().union(*(s["outcomes"] for s in self.summaries)))
+        index = {value: i for i, value in enumerate(vocabulary)}
+        counts = np.zeros((len(self.summaries), len(vocabulary), len(OUTCOMES)), dtype=np.int64)
+        for row, summary in enumerate(self.summaries):
+            for nationality, results in summary["outcomes"].items():
+                for name, count in results.items():
+                    counts[row, index[nationality], OUTCOMES.index(name)] = count
+        return vocabulary, counts
+
+    def enrolment(self, dimension="nationality", top=None):
+        vocabulary, counts = self.matrix(dimension)
+        order = np.argsort(-counts[-1], kind="stable")[:top] if len(vocabulary) else []
+        change = np.diff(counts, axis=0, prepend=counts[:1])
+        return [(vocabulary[i], counts[:, i].tolist(), change[:, i].tolist()) for i in order]
+
+    def repeat_rates(self, top=None):
+        vocabulary, counts = self.outcome_tensor()
+        repeat = OUTCOMES.index("repeat")
+        assessed = counts[:, :, [OUTCOMES.index("pass"), repeat, OUTCOMES.index("fail")]].sum(axis=2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            overall = counts[:, :, repeat].sum(axis=1) / assessed.sum(axis=1)
+            rates = counts[:, :, repeat] / assessed
+        order = np.argsort(-assessed[-1], kind="stable")[:top] if len(vocabulary) else []
+        rows = [(vocabulary[i], rates[:, i].tolist(), assessed[:, i].tolist()) for i in order]
+        return overall.tolist(), rows
+
+    def progression(self):
+        # Level transition counts between consecutive snapshots, for students in both
+        vocabulary, _ = self.matrix("level")
+        index = {value: i for i, value in enumerate(vocabulary)}
+        steps = []
+        for before, after in zip(self.summaries, self.summaries[1:]):
+            moves = np.zeros((len(vocabulary), len(vocabulary)), dtype=np.int64)
+            for email, level in before["levels_by_email"].items():
+                later = after["levels_by_email"].get(email)
+                if later:
+                    moves[index[level], index[later]] += 1
+            steps.append(moves)
+        return vocabulary, steps
+
+
+def _rate(value):
+    return "   -  " if value != value else f"{value * 100:5.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trend queries across dated ALL THE STUDENTS snapshots.")
+    parser.add_argument("query", choices=["enrolment", "levels", "repeat-rate", "progression"])
+    parser.add_argument("--directory", default=SCRIPT_DIR)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    if np is None:
+        print("⚠️ numpy is not installed; the trend queries need it")
+        return
+    paths = find_snapshots(args.directory)
+    if not paths:
+        print(f"⚠️ No '{SNAPSHOT_PATTERN}' snapshots in {args.directory}")
+        return
+    cache = SnapshotCache(os.path.join(args.directory, CACHE_FILENAME))
+    cohort = Cohort(paths, cache)
+    cache.save()
+
+    header = "".join(f"{date:>14s}" for date in cohort.dates)
+    print(f"{'':24s}{header}")
+    if args.query in ("enrolment", "levels"):
+        dimension = "nationality" if args.query == "enrolment" else "level"
+        print(f"{'students':24s}" + "".join(f"{s['students']:14d}" for s in cohort.summaries))
+        for value, counts, change in cohort.enrolment(dimension, args.top):
+            print(f"{value[:24]:24s}" + "".join(f"{c:8d} ({d:+4d})" for c, d in zip(counts, change)))
+    elif args.query == "repeat-rate":
+        overall, rows = cohort.repeat_rates(args.top)
+        print(f"{'all assessed':24s}" + "".join(f"{_rate(r):>14s}" for r in overall))
+        for value, rates, assessed in rows:
+            print(f"{value[:24]:24s}" + "".join(f"{_rate(r):>8s} ({n:3d})" for r, n in zip(rates, assessed)))
+    else:
+        vocabulary, steps = cohort.progression()
+        for (before, after), moves in zip(zip(cohort.dates, cohort.dates[1:]), steps):
+            print(f"📈 {before} -> {after}")
+            for i, j in zip(*np.nonzero(moves)):
+                print(f"   {vocabulary[i]:>8s} -> {vocabulary[j]:<8s} {moves[i, j]:5d}")
+
+
+if __name__ == "__main__":
+    main()
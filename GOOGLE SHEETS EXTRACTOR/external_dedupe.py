@@ -0,0 +1,184 @@
+import argparse
+import heapq
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import unicodedata
+
+from quality_profile import iter_json_array
+from student_validation import EMAIL_KEYS, STUDENT_ID_KEYS, first_value
+
+# Exact de-duplication of roster records that do not fit in memory.
+# Records stream in (iter_json_array, never the whole file) and each becomes
+# one line "key \x1f seq \x1f json". Lines are buffered until the memory
+# budget is reached, sorted and spilled to a run file in a temp directory.
+# The runs are then k-way merged with heapq.merge; equal keys arrive next to
+# each other, so one streaming pass keeps one record per key and writes it
+# out. The record JSON is copied through as text, never decoded again.
+#
+#   key      normalised email (NFKC, no spaces, lower case), or the Student
+#            ID when a record has no email; records with neither are dropped
+#   seq      input position, fixed width, so plain string order is key order
+#            and then input order ("\x1f" sorts below every printable char)
+#   --keep   first or last occurrence of a key wins (last = later source)
+#
+# More than MAX_OPEN_RUNS runs are merged in passes, so open files stay
+# bounded. If everything fits in the budget nothing is spilled. The output
+# is a JSON list in key order, one record per line.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INPUT = os.path.join(SCRIPT_DIR, "ALL THE STUDENTS 03-09-2025.json")
+DEFAULT_OUTPUT = os.path.join(SCRIPT_DIR, "ALL THE STUDENTS deduplicated.json")
+
+DEFAULT_MEMORY_MB = 256
+MAX_OPEN_RUNS = 64
+LINE_OVERHEAD = 64  # per buffered str object and its list slot
+SEPARATOR = "\x1f"
+SEQ_WIDTH = 12
+
+_ID_NOISE = re.compile(r"[\s\-_/.]+")
+
+
+def dedupe_key(record):
+    # Keys matched by normalised header, as in student_validation
+    value = first_value(record, EMAIL_KEYS)
+    if value:
+        text = "".join(str(value).split()).lower()
+        if not text.isascii():
+            text = unicodedata.normalize("NFKC", text).replace("。", ".")
+        return "e:" + text
+    value = first_value(record, STUDENT_ID_KEYS)
+    if value:
+        return "i:" + _ID_NOISE.sub("", str(value).upper())
+    return None
+
+
+def _spill(lines, temp_dir, runs):
+    lines.sort()
+    path = os.path.join(temp_dir, f"run{len(runs):05d}.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    runs.append(path)
+
+
+def _merge_runs(paths, temp_dir, runs):
+    # One intermediate pass: a single sorted run from several
+    files = [open(path, "r", encoding="utf-8") for path in paths]
+    out_path = os.path.join(temp_dir, f"run{len(runs):05d}.txt")
+    try:
+        with open(out_path, "w", encoding="utf-8") as out:
+            out.writelines(heapq.merge(*files))
+    finally:
+        for f in files:
+            f.close()
+    for path in paths:
+        os.remove(path)
+    runs.append(out_path)
+    return out_path
+
+
+def sorted_runs(records, memory_bytes, temp_dir, stats):
+    # Returns (spilled run paths, lines still in memory, already sorted)
+    runs = []
+    lines = []
+    used = 0
+    for seq, record in enumerate(records):
+        stats["rows_in"] += 1
+        key = dedupe_key(record)
+        if key is None:
+            stats["rows_keyless"] += 1
+            continue
+        line = f"{key}{SEPARATOR}{seq:0{SEQ_WIDTH}d}{SEPARATOR}{json.dumps(record, ensure_ascii=False)}\n"
+        lines.append(line)
+        used += len(line) + LINE_OVERHEAD
+        if used >= memory_bytes:
+            _spill(lines, temp_dir, runs)
+            lines = []
+            used = 0
+    lines.sort()
+    if runs and lines:
+        _spill(lines, temp_dir, runs)
+        lines = []
+    stats["runs"] = len(runs)
+    return runs, lines
+
+
+def _unique(lines, keep):
+    # lines arrive in key order; yields the record JSON of one line per key
+    current = None
+    chosen = None
+    for line in lines:
+        key, _, rest = line.partition(SEPARATOR)
+        if key != current:
+            if chosen is not None:
+                yield chosen
+            current = key
+            chosen = rest
+        elif keep == "last":
+            chosen = rest
+    if chosen is not None:
+        yield chosen
+
+
+def dedupe(records, output_path, memory_mb=DEFAULT_MEMORY_MB, keep="first", temp_dir=None):
+    stats = {"rows_in": 0, "rows_keyless": 0, "rows_out": 0, "duplicates": 0, "runs": 0, "merge_passes": 0}
+    work_dir = tempfile.mkdtemp(prefix="dedupe_", dir=temp_dir)
+    try:
+        runs, lines = sorted_runs(records, memory_mb * 1024 * 1024, work_dir, stats)
+        all_runs = list(runs)
+        while len(runs) > MAX_OPEN_RUNS:
+            stats["merge_passes"] += 1
+            runs = [_merge_runs(runs[i:i + MAX_OPEN_RUNS], work_dir, all_runs)
+                    for i in range(0, len(runs), MAX_OPEN_RUNS)]
+
+        files = [open(path, "r", encoding="utf-8") for path in runs]
+        try:
+            merged = heapq.merge(*files) if files else iter(lines)
+            with open(output_path, "w", encoding="utf-8") as out:
+                out.write("[")
+                for rest in _unique(merged, keep):
+                    out.write(",\n" if stats["rows_out"] else "\n")
+                    # rest is "seq \x1f json\n"
+                    out.write(rest[SEQ_WIDTH + 1:-1])
+                    stats["rows_out"] += 1
+                out.write("\n]\n")
+        finally:
+            for f in files:
+                f.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    stats["duplicates"] = stats["rows_in"] - stats["rows_keyless"] - stats["rows_out"]
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="De-duplicate roster JSON files by email / Student ID on disk.")
+    parser.add_argument("inputs", nargs="*", default=[DEFAULT_INPUT])
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--memory-mb", type=float, default=DEFAULT_MEMORY_MB,
+                        help="buffer size before a sorted run is spilled to disk")
+    parser.add_argument("--keep", choices=["first", "last"], default="first",
+                        help="which occurrence of a repeated student is written")
+    parser.add_argument("--temp-dir", help="where sorted runs are spilled (default: system temp)")
+    args = parser.parse_args()
+
+    def records():
+        for path in args.inputs:
+            yield from iter_json_array(path)
+
+    started = time.perf_counter()
+    stats = dedupe(records(), args.output, args.memory_mb, args.keep, args.temp_dir)
+    elapsed = time.perf_counter() - started
+
+    print(f"✅ {stats['rows_in']} rows in, {stats['rows_out']} out, {stats['duplicates']} duplicates, "
+          f"{stats['rows_keyless']} without email or Student ID")
+    print(f"🧹 {stats['runs']} sorted runs spilled, {stats['merge_passes']} extra merge passes")
+    print(f"⏱️ {elapsed:.2f}s, {stats['rows_in'] / max(elapsed, 1e-9):.0f} rows/s")
+    print(f"💾 Saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,488 @@
+import argparse
+import csv
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+import requests
+
+import sheets_engine
+
+# Local stand-in for the Google Sheets export endpoints, so the engine can be
+# exercised offline. Workbooks are {spreadsheet_id: {gid: csv_text}} and are
+# served under the same URL shapes the engine requests:
+#   /spreadsheets/d/{id}/export?format=csv&gid={gid}[&range=A5:J]
+#   /spreadsheets/d/{id}/gviz/tq?tqx=out:csv&gid={gid}[&range=...][&tq=select B,C]
+# Ranges may be A1 ("A5:J", "A5:J100") or rows only ("51:550").
+# latency (seconds before the response) and bandwidth (bytes/s per
+# connection) make it usable as a slow network for benchmarks.
+# rate_limit (requests/s, bursts of the same size) answers 429 with a
+# Retry-After once exceeded, and max_concurrent answers 503 to requests beyond
+# that many in progress, like the export endpoint under quota pressure.
+# error_rate answers that fraction of requests with a random 500/502/503
+# (seeded, so a benchmark sees the same failures every run).
+# Every body carries an ETag (hash of the bytes) and If-None-Match gets a
+# 304, so conditional revalidation can be exercised; Google's export does not
+# promise ETags, so code must also work without them.
+# export?format=xlsx returns the whole spreadsheet as a minimal XLSX, one
+# sheet per gid, all cells as strings.
+# Workbooks come from a folder of CSVs, which --record fills from the real
+# export for a manifest, or from --synthetic (synthetic_sheet's wide class
+# rosters, also used by the benchmarks) together with a matching manifest.
+
+EXPORT_PATH = re.compile(r"^/spreadsheets/d/([a-zA-Z0-9-_]+)/export$")
+GVIZ_PATH = re.compile(r"^/spreadsheets/d/([a-zA-Z0-9-_]+)/gviz/tq$")
+A1_RANGE = re.compile(r"^([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$")
+WRITE_BLOCK = 16 * 1024
+ERROR_STATUSES = (500, 502, 503)
+XLSX_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+XLSX_SHEET_NAME = 31
+
+ROSTER_HEADERS = [
+    "No.", "Student ID", "Student Name", "Gender", "Nationality",
+    "Email", "Visa", "Current Location", "Remark", "PASS / REPEAT"
+]
+
+
+def column_index(letters):
+    index = 0
+    for ch in letters:
+        index = index * 26 + (ord(ch) - ord("A") + 1)
+    return index - 1
+
+
+def apply_range(rows, a1_range):
+    match = A1_RANGE.match(a1_range or "")
+    if not match:
+        return rows
+    first_col, first_row, last_col, last_row = match.groups()
+    c1 = column_index(first_col) if first_col else 0
+    c2 = column_index(last_col) if last_col else None
+    r1 = int(first_row) - 1 if first_row else 0
+    r2 = int(last_row) if last_row else None
+    sliced = rows[r1:r2]
+    return [row[c1:None if c2 is None else c2 + 1] for row in sliced]
+
+
+def apply_select(rows, query):
+    match = re.match(r"^\s*select\s+(.+?)\s*$", query or "", re.IGNORECASE)
+    if not match:
+        return rows
+    indexes = [column_index(c.strip().upper()) for c in match.group(1).split(",")]
+    return [[row[i] if i < len(row) else "" for i in indexes] for row in rows]
+
+
+def _sheet_xml(rows):
+    out = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+           '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>']
+    for r, row in enumerate(rows, 1):
+        out.append(f'<row r="{r}">')
+        for c, value in enumerate(row):
+            if value:
+                out.append(f'<c r="{sheets_engine.column_letter(c)}{r}" t="inlineStr"><is><t xml:space="preserve">'
+                           f'{escape(value)}</t></is></c>')
+        out.append("</row>")
+    out.append("</sheetData></worksheet>")
+    return "".join(out)
+
+
+def render_xlsx(sheets):
+    # sheets: [(name, rows)]; just the parts Excel, openpyxl and pandas need
+    ns = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+    rel_ns = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+    sheet_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        + "".join(f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType="{sheet_type}"/>'
+                  for i in range(1, len(sheets) + 1))
+        + "</Types>"
+    )
+    root_rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{rel_ns}/officeDocument" Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    )
+    workbook = (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<workbook xmlns="{ns}" xmlns:r="{rel_ns}"><sheets>'
+        + "".join(f'<sheet name="{escape(name[:XLSX_SHEET_NAME])}" sheetId="{i}" r:id="rId{i}"/>'
+                  for i, (name, _) in enumerate(sheets, 1))
+        + "</sheets></workbook>"
+    )
+    workbook_rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        + "".join(f'<Relationship Id="rId{i}" Type="{rel_ns}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+                  for i in range(1, len(sheets) + 1))
+        + "</Relationships>"
+    )
+    out = BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as xlsx:
+        xlsx.writestr("[Content_Types].xml", content_types)
+        xlsx.writestr("_rels/.rels", root_rels)
+        xlsx.writestr("xl/workbook.xml", workbook)
+        xlsx.writestr("xl/_rels/workbook.xml.rels", workbook_rels)
+        for i, (_, rows) in enumerate(sheets, 1):
+            xlsx.writestr(f"xl/worksheets/sheet{i}.xml", _sheet_xml(rows))
+    return out.getvalue()
+
+
+def render_csv(rows, quote_all=False, lineterminator="\r\n"):
+    out = StringIO()
+    quoting = csv.QUOTE_ALL if quote_all else csv.QUOTE_MINIMAL
+    csv.writer(out, quoting=quoting, lineterminator=lineterminator).writerows(rows)
+    return out.getvalue()
+
+
+class FakeSheetsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        export_match = EXPORT_PATH.match(parsed.path)
+        gviz_match = GVIZ_PATH.match(parsed.path)
+        match = export_match or gviz_match
+        if not match:
+            return self.send_error(404)
+
+        xlsx = export_match is not None and query.get("format") == "xlsx"
+        if xlsx:
+            sheets = self.server.workbook_rows(match.group(1))
+            if not sheets:
+                return self.send_error(404)
+        else:
+            rows = self.server.worksheet_rows(match.group(1), query.get("gid", "0"))
+            if rows is None:
+                return self.send_error(404)
+
+        refusal = self.server.admit()
+        if refusal is not None:
+            return self.send_refusal(*refusal)
+        try:
+            self.server.count_request(parsed.path, query)
+            if xlsx:
+                self.send_body(render_xlsx(sheets), XLSX_TYPE)
+            else:
+                self.send_worksheet(rows, query, gviz_match)
+        finally:
+            self.server.finish()
+
+    def send_refusal(self, status, retry_after):
+        self.send_response(status)
+        if retry_after is not None:
+            self.send_header("Retry-After", str(retry_after))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def send_worksheet(self, rows, query, gviz_match):
+        rows = apply_range(rows, query.get("range"))
+        if gviz_match:
+            rows = apply_select(rows, query.get("tq"))
+            body = render_csv(rows, quote_all=True, lineterminator="\n")
+        else:
+            body = render_csv(rows)
+
+        self.send_body(body.encode("utf-8"), "text/csv; charset=utf-8")
+
+    def send_body(self, payload, content_type):
+        etag = '"' + hashlib.sha1(payload).hexdigest() + '"'
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+            self.server.count_not_modified()
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.write_throttled(payload)
+
+    def write_throttled(self, payload):
+        bandwidth = self.server.bandwidth
+        if not bandwidth:
+            self.wfile.write(payload)
+            return
+        started = time.perf_counter()
+        sent = 0
+        for i in range(0, len(payload), WRITE_BLOCK):
+            block = payload[i:i + WRITE_BLOCK]
+            self.wfile.write(block)
+            sent += len(block)
+            ahead = sent / bandwidth - (time.perf_counter() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+
+class FakeSheetsServer:
+    def __init__(self, workbooks=None, host="127.0.0.1", port=0, latency=0.0, bandwidth=None,
+                 rate_limit=None, max_concurrent=None, error_rate=0.0, seed=0):
+        self.httpd = ThreadingHTTPServer((host, port), FakeSheetsHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.workbooks = workbooks or {}
+        self.httpd.latency = latency
+        self.httpd.bandwidth = bandwidth
+        self.httpd.requests = []
+        self.httpd.lock = threading.Lock()
+        self.httpd.count_request = self._count_request
+        self.httpd.worksheet_rows = self._worksheet_rows
+        self.httpd.workbook_rows = self._workbook_rows
+        self.httpd.admit = self._admit
+        self.httpd.finish = self._finish
+        self.httpd.count_not_modified = self._count_not_modified
+        self.httpd.refused = {429: 0, 503: 0}
+        self.httpd.refused.update((status, 0) for status in ERROR_STATUSES)
+        self.httpd.not_modified = 0
+        self.rate_limit = rate_limit
+        self.max_concurrent = max_concurrent
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._tokens = float(rate_limit or 0)
+        self._tokens_at = time.monotonic()
+        self._active = 0
+        self._parsed = {}
+        self.thread = None
+
+    def _count_request(self, path, query):
+        with self.httpd.lock:
+            self.httpd.requests.append((path, query))
+
+    def _admit(self):
+        # None to serve the request, else (status, Retry-After seconds)
+        with self.httpd.lock:
+            if self.rate_limit:
+                now = time.monotonic()
+                self._tokens = min(self.rate_limit, self._tokens + (now - self._tokens_at) * self.rate_limit)
+                self._tokens_at = now
+                if self._tokens < 1:
+                    self.httpd.refused[429] += 1
+                    return 429, max(1, math.ceil((1 - self._tokens) / self.rate_limit))
+                self._tokens -= 1
+            if self.error_rate and self._random.random() < self.error_rate:
+                status = self._random.choice(ERROR_STATUSES)
+                self.httpd.refused[status] += 1
+                return status, None
+            if self.max_concurrent and self._active >= self.max_concurrent:
+                self.httpd.refused[503] += 1
+                return 503, None
+            self._active += 1
+        return None
+
+    def _finish(self):
+        with self.httpd.lock:
+            self._active -= 1
+
+    def _count_not_modified(self):
+        with self.httpd.lock:
+            self.httpd.not_modified += 1
+
+    def _worksheet_rows(self, spreadsheet_id, gid):
+        # Parsed rows are cached per worksheet text so range requests stay cheap
+        text = self.httpd.workbooks.get(spreadsheet_id, {}).get(gid)
+        if text is None:
+            return None
+        key = (spreadsheet_id, gid)
+        with self.httpd.lock:
+            cached = self._parsed.get(key)
+            if cached is None or cached[0] is not text:
+                cached = (text, list(csv.reader(StringIO(text))))
+                self._parsed[key] = cached
+        return cached[1]
+
+    def _workbook_rows(self, spreadsheet_id):
+        gids = self.httpd.workbooks.get(spreadsheet_id, {})
+        return [(gid, self._worksheet_rows(spreadsheet_id, gid)) for gid in list(gids)]
+
+    def set_worksheet(self, spreadsheet_id, gid, text):
+        # Edits a worksheet while serving, e.g. to test incremental refresh
+        with self.httpd.lock:
+            self.httpd.workbooks.setdefault(spreadsheet_id, {})[gid] = text
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    @property
+    def refused(self):
+        return self.httpd.refused
+
+    @property
+    def not_modified(self):
+        return self.httpd.not_modified
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def load_workbooks(directory):
+    # directory/{spreadsheet_id}/{gid}.csv
+    workbooks = {}
+    for spreadsheet_id in sorted(os.listdir(directory)):
+        sheet_dir = os.path.join(directory, spreadsheet_id)
+        if not os.path.isdir(sheet_dir):
+            continue
+        for name in sorted(os.listdir(sheet_dir)):
+            if name.endswith(".csv"):
+                with open(os.path.join(sheet_dir, name), "r", encoding="utf-8", newline="") as f:
+                    workbooks.setdefault(spreadsheet_id, {})[name[:-4]] = f.read()
+    return workbooks
+
+
+def save_workbooks(workbooks, directory):
+    for spreadsheet_id, worksheets in workbooks.items():
+        sheet_dir = os.path.join(directory, spreadsheet_id)
+        os.makedirs(sheet_dir, exist_ok=True)
+        for gid, text in worksheets.items():
+            with open(os.path.join(sheet_dir, f"{gid}.csv"), "w", encoding="utf-8", newline="") as f:
+                f.write(text)
+
+
+def record_workbooks(manifest, directory):
+    # Full CSV exports of the manifest's worksheets from the real endpoint
+    # (or SHEETS_BASE_URL), saved in the layout load_workbooks() reads
+    session = requests.Session()
+    saved = 0
+    for sheet in manifest["spreadsheets"]:
+        spreadsheet_id = sheet["spreadsheet_id"]
+        sheet_dir = os.path.join(directory, spreadsheet_id)
+        os.makedirs(sheet_dir, exist_ok=True)
+        for gid in sheet["gids"]:
+            response = session.get(sheets_engine.export_url(spreadsheet_id, gid), timeout=sheets_engine.REQUEST_TIMEOUT)
+            if response.status_code != 200:
+                print(f"⚠️ Failed to record {spreadsheet_id} gid {gid} (HTTP {response.status_code})")
+                continue
+            with open(os.path.join(sheet_dir, f"{gid}.csv"), "wb") as f:
+                f.write(response.content)
+            saved += 1
+    return saved
+
+
+def synthetic_sheet(rows, columns, seed=7):
+    # A wide class sheet: four note rows, the roster header plus attendance
+    # columns up to `columns`, then `rows` students
+    rng = random.Random(seed)
+    out = StringIO()
+    writer = csv.writer(out, lineterminator="\r\n")
+    filler = [""] * columns
+    for i in range(4):
+        writer.writerow(["", f"NOTE {i}"] + filler[2:])
+    attendance = [f"Day {i}" for i in range(columns - len(ROSTER_HEADERS))]
+    writer.writerow(ROSTER_HEADERS + attendance)
+    marks = ["1", "0", "PRESENT", "ABSENT", "", ""]
+    for n in range(rows):
+        writer.writerow([
+            str(n + 1), f"2025KL{n:05d}", f"STUDENT NUMBER {n}", rng.choice("MF"),
+            rng.choice(["CHINA", "YEMEN", "LIBYA"]), f"student{n}@qq.com", "SOCIAL",
+            "HC", rng.choice(["N", "REPEAT", "Remark with, comma"]), "PASS",
+        ] + [rng.choice(marks) for _ in attendance])
+    return out.getvalue()
+
+
+def synthetic_workbooks(spreadsheets=3, worksheets=8, rows=500, columns=30, seed=7):
+    # Roster-shaped workbooks and the manifest that extracts them
+    workbooks = {}
+    manifest = {"spreadsheets": []}
+    for s in range(spreadsheets):
+        spreadsheet_id = f"SYNTHETIC{s:03d}"
+        gids = [str(1000 + g) for g in range(worksheets)]
+        workbooks[spreadsheet_id] = {
+            gid: synthetic_sheet(rows, columns, seed=seed + s * worksheets + g) for g, gid in enumerate(gids)
+        }
+        manifest["spreadsheets"].append({
+            "spreadsheet_id": spreadsheet_id, "schema": "roster",
+            "output": f"Sheets Data Extractor {spreadsheet_id}.json", "gids": gids,
+        })
+    return workbooks, manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve CSV workbooks under Google Sheets export URLs.")
+    parser.add_argument("directory", nargs="?", help="folder containing {spreadsheet_id}/{gid}.csv files")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each response")
+    parser.add_argument("--bandwidth", type=int, help="bytes per second per connection")
+    parser.add_argument("--rate-limit", type=float, help="requests per second before answering 429")
+    parser.add_argument("--max-concurrent", type=int, help="requests in progress before answering 503")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 5xx")
+    parser.add_argument("--seed", type=int, default=0, help="seed for --error-rate and --synthetic")
+    parser.add_argument("--record", metavar="MANIFEST",
+                        help="download the manifest's worksheets into DIRECTORY and exit")
+    parser.add_argument("--synthetic", type=int, metavar="SPREADSHEETS",
+                        help="serve generated roster workbooks instead of a folder")
+    parser.add_argument("--worksheets", type=int, default=8, help="--synthetic: worksheets per spreadsheet")
+    parser.add_argument("--rows", type=int, default=500, help="--synthetic: rows per worksheet")
+    parser.add_argument("--write-manifest", help="--synthetic: save the matching extraction manifest here")
+    args = parser.parse_args()
+
+    if args.record:
+        if not args.directory:
+            parser.error("--record needs a DIRECTORY to save into")
+        with open(args.record, "r", encoding="utf-8") as f:
+            saved = record_workbooks(json.load(f), args.directory)
+        print(f"💾 Recorded {saved} worksheets into {args.directory}")
+        return
+    if args.synthetic:
+        workbooks, manifest = synthetic_workbooks(args.synthetic, args.worksheets, args.rows, seed=args.seed)
+        source = f"{args.synthetic} synthetic spreadsheets"
+        if args.write_manifest:
+            with open(args.write_manifest, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+            print(f"📄 Manifest saved to: {args.write_manifest}")
+    elif args.directory:
+        workbooks, source = load_workbooks(args.directory), args.directory
+    else:
+        parser.error("give a DIRECTORY of workbooks or --synthetic")
+
+    server = FakeSheetsServer(
+        workbooks, port=args.port, latency=args.latency, bandwidth=args.bandwidth,
+        rate_limit=args.rate_limit, max_concurrent=args.max_concurrent, error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    print(f"🧪 Serving {source} at {server.url} (use --base-url {server.url} or SHEETS_BASE_URL)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+
+# One scheduler for every request of a run, shared by all spreadsheets.
+# Per host it keeps
+#   a token bucket   - at most `rate` requests/s with bursts of `burst`
+#                      (rate 0 leaves the bucket out)
+#   an AIMD limit    - requests allowed in flight; +1/limit per healthy
+#                      response while the limit is full (about +1 per round
+#                      of requests), halved on 429/503, at most once per round
+#   a pause          - a throttled response stops the whole host until its
+#                      Retry-After (seconds or HTTP date) or an exponential
+#                      backoff with jitter has passed
+# Throttled responses, 5xx and connection errors are retried up to
+# max_retries times, so a busy endpoint slows the run down instead of
+# losing worksheets. After the last retry the response (or error) is handed
+# back to the caller as before.
+#
+# scheduler.session(requests_session) returns an object with the same get()
+# the engine and chunked_download already call.
+
+DEFAULT_RATE = 0.0
+DEFAULT_BURST = 10
+INITIAL_CONCURRENCY = 2
+MAX_CONCURRENCY = 16
+MAX_RETRIES = 6
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 60.0
+
+THROTTLE_STATUSES = {429, 503}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def retry_after_seconds(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def wait_time(self, now):
+        # Seconds until a token is free; takes it when that is 0
+        if not self.rate:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class HostState:
+    def __init__(self, rate, burst, initial, maximum):
+        self.bucket = TokenBucket(rate, burst)
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.peak = 0
+
+
+class FetchScheduler:
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, initial=INITIAL_CONCURRENCY,
+                 maximum=MAX_CONCURRENCY, max_retries=MAX_RETRIES):
+        self.rate = rate
+        self.burst = burst
+        self.initial = min(initial, maximum)
+        self.maximum = maximum
+        self.max_retries = max_retries
+        self.hosts = {}
+        self.condition = threading.Condition()
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "errors": 0, "waited_seconds": 0.0}
+
+    def session(self, session):
+        return ScheduledSession(self, session)
+
+    def _host(self, url):
+        host = urlparse(url).netloc
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState(self.rate, self.burst, self.initial, self.maximum)
+        return state
+
+    def _acquire(self, state):
+        started = time.monotonic()
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                if now < state.paused_until:
+                    self.condition.wait(state.paused_until - now)
+                    continue
+                if state.in_flight >= int(state.limit):
+                    self.condition.wait()
+                    continue
+                delay = state.bucket.wait_time(now)
+                if delay:
+                    self.condition.wait(delay)
+                    continue
+                state.in_flight += 1
+                state.peak = max(state.peak, state.in_flight)
+                self.stats["requests"] += 1
+                self.stats["waited_seconds"] += now - started
+                return now
+
+    def _release(self, state, sent_at, outcome, wait=None):
+        # outcome: "ok" grows the limit, "throttled" shrinks it, "error" leaves it
+        with self.condition:
+            state.in_flight -= 1
+            now = time.monotonic()
+            if outcome == "throttled":
+                self.stats["throttled"] += 1
+                # Only one decrease per round: answers to requests sent before
+                # the last decrease describe the old limit
+                if sent_at >= state.last_decrease:
+                    state.limit = max(1.0, state.limit / 2)
+                    state.last_decrease = now
+            elif outcome == "ok" and state.in_flight + 1 >= int(state.limit):
+                # Grown only while the limit is what holds requests back
+                state.limit = min(state.maximum, state.limit + 1 / state.limit)
+            if wait is not None:
+                state.paused_until = max(state.paused_until, now + wait)
+            self.condition.notify_all()
+
+    def _count(self, key):
+        with self.condition:
+            self.stats[key] += 1
+
+    def _backoff(self, attempt):
+        return min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+    def get(self, session, url, **kwargs):
+        state = self._host(url)
+        attempt = 0
+        while True:
+            sent_at = self._acquire(state)
+            try:
+                response = session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._release(state, sent_at, "error")
+                self._count("errors")
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                self._count("retries")
+                continue
+
+            status = response.status_code
+            outcome = "throttled" if status in THROTTLE_STATUSES else "error" if status >= 500 else "ok"
+            if status not in RETRY_STATUSES or attempt >= self.max_retries:
+                self._release(state, sent_at, outcome)
+                return response
+            if outcome == "throttled":
+                wait = retry_after_seconds(response)
+                self._release(state, sent_at, outcome, self._backoff(attempt) if wait is None else wait)
+            else:
+                self._release(state, sent_at, outcome)
+                self._count("errors")
+                time.sleep(self._backoff(attempt))
+            response.close()
+            attempt += 1
+            self._count("retries")
+
+    def summary(self):
+        hosts = {
+            host: {"limit": round(state.limit, 2), "peak_in_flight": state.peak}
+            for host, state in self.hosts.items()
+        }
+        return dict(self.stats, waited_seconds=round(self.stats["waited_seconds"], 2), hosts=hosts)
+
+
+class ScheduledSession:
+    def __init__(self, scheduler, session):
+        self.scheduler = scheduler
+        self.session = session
+
+    def get(self, url, **kwargs):
+        return self.scheduler.get(self.session, url, **kwargs)
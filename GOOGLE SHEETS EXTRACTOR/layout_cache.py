@@ -0,0 +1,70 @@
+import hashlib
+import json
+import os
+import time
+
+from run_journal import schemas_fingerprint
+
+# Header-row detection cache shared by every worksheet the engine parses.
+# Class tabs in one spreadsheet normally share a layout, so once a header row
+# has been found its fingerprint (schema name and contents, row position and
+# the stripped cells, case kept) is stored with the resolved column plan. The
+# next sheet whose row at that position hashes the same skips detection and
+# plan resolution. A changed header (even only its casing, which the output
+# keys keep), a header that moved or an edited schema hashes differently and
+# simply misses. Title rows above the header carry class and teacher names
+# that differ per tab, so they are not part of the key.
+
+FINGERPRINT_FILENAME = "layout_fingerprints.json"
+MAX_ENTRIES = 5000
+
+
+def schema_key(schema_name, schema):
+    return f"{schema_name}:{schemas_fingerprint({schema_name: schema})}"
+
+
+def row_fingerprint(schema_key, index, row):
+    cells = "\x1f".join(cell.strip() for cell in row)
+    return hashlib.sha1(f"{schema_key}\x1e{index}\x1e{cells}".encode("utf-8")).hexdigest()
+
+
+class LayoutCache:
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def lookup(self, schema_key, index, row):
+        entry = self.entries.get(row_fingerprint(schema_key, index, row))
+        if entry is None:
+            return None
+        entry["last_seen"] = int(time.time())
+        self.dirty = True
+        return {
+            "plan": [tuple(p) for p in entry["plan"]],
+            "filter_positions": entry["filter_positions"],
+            "columns": entry["columns"],
+        }
+
+    def store(self, schema_key, index, header, column_plan):
+        self.entries[row_fingerprint(schema_key, index, header)] = {
+            "header_row": index,
+            "plan": [list(p) for p in column_plan["plan"]],
+            "filter_positions": column_plan["filter_positions"],
+            "columns": column_plan["columns"],
+            "last_seen": int(time.time()),
+        }
+        self.dirty = True
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        if len(self.entries) > MAX_ENTRIES:
+            newest = sorted(self.entries.items(), key=lambda item: item[1]["last_seen"], reverse=True)
+            self.entries = dict(newest[:MAX_ENTRIES])
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        self.dirty = False
@@ -0,0 +1,125 @@
+import json
+import os
+import sys
+import threading
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Memory ceiling for the extraction engine.
+# MemoryBudget counts the bytes of records that have been parsed but not yet
+# written: worksheets finished by a fetch worker and waiting to be consumed,
+# plus the records a SpreadsheetSink still holds. The engine stops starting
+# new fetches while the budget is over its ceiling, and a sink that pushes
+# the count past FLUSH_FRACTION of the ceiling writes its records out.
+# Sizes are estimates from str lengths and CPython object overheads, not a
+# measurement; peak_rss_mb() reports what the process really reached.
+# A worksheet is the smallest unit, so the count can pass the ceiling by up
+# to one worksheet per fetch worker.
+#
+# JsonListWriter writes the same text as json.dump(records, f, indent=2,
+# ensure_ascii=False), one record at a time, into "<path>.part", and moves
+# it over <path> only when closed, so a failed run never leaves half a file.
+
+FLUSH_FRACTION = 0.5
+RECORD_OVERHEAD = 240  # dict with a handful of keys
+VALUE_OVERHEAD = 56  # str object header
+
+
+def estimate_bytes(records):
+    total = 0
+    for record in records:
+        total += RECORD_OVERHEAD
+        for value in record.values():
+            total += VALUE_OVERHEAD + len(value if isinstance(value, str) else str(value))
+    return total
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class MemoryBudget:
+    def __init__(self, limit_mb=0):
+        self.limit = int(limit_mb * 1024 * 1024)
+        self.used = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def charge(self, size):
+        with self.lock:
+            self.used += size
+            self.peak = max(self.peak, self.used)
+
+    def release(self, size):
+        with self.lock:
+            self.used -= size
+
+    def over(self, fraction=1.0):
+        return bool(self.limit) and self.used >= self.limit * fraction
+
+
+class JsonListWriter:
+    def __init__(self, path):
+        self.path = path
+        self.part_path = path + ".part"
+        self.file = open(self.part_path, "w", encoding="utf-8")
+        self.count = 0
+
+    def write_many(self, records):
+        for record in records:
+            text = json.dumps(record, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+            self.file.write(("[\n  " if not self.count else ",\n  ") + text)
+            self.count += 1
+
+    def close(self):
+        self.file.write("\n]" if self.count else "[]")
+        self.file.close()
+        os.replace(self.part_path, self.path)
+
+    def discard(self):
+        self.file.close()
+        os.remove(self.part_path)
+
+
+class SpreadsheetSink:
+    # Collects one output file's records; with a ceiling, writes them out
+    # early instead of holding the whole spreadsheet in memory
+    def __init__(self, path, budget):
+        self.writer = JsonListWriter(path)
+        self.budget = budget
+        self.pending = []
+        self.pending_bytes = 0
+        self.flushes = 0
+
+    def add(self, records):
+        size = estimate_bytes(records) if self.budget.limit else 0
+        self.pending.extend(records)
+        self.pending_bytes += size
+        self.budget.charge(size)
+        if self.budget.over(FLUSH_FRACTION):
+            self.flush()
+
+    def flush(self):
+        self._write()
+        self.flushes += 1
+
+    def _write(self):
+        self.writer.write_many(self.pending)
+        self.budget.release(self.pending_bytes)
+        self.pending = []
+        self.pending_bytes = 0
+
+    def close(self):
+        # Returns the records still in memory when nothing was flushed early,
+        # else None (the caller re-reads the file if it needs them)
+        kept = self.pending if not self.flushes else None
+        self._write()
+        self.writer.close()
+        return kept
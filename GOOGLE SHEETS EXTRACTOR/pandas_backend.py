@@ -0,0 +1,111 @@
+from io import BytesIO, StringIO
+from itertools import compress
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    np = pd = None
+
+# Optional vectorised body extraction for very large worksheets.
+# The export body below the header is read by pandas' C parser with usecols
+# set to the planned and filtered columns, so the rest of the sheet is never
+# turned into Python objects. Stripping, blank-row dropping and the schema's
+# row filters then run once per column instead of once per row, combined as
+# numpy boolean masks. Records and rows_filtered counts are the same as the
+# pure-Python path.
+#
+# Cells stay Python str (dtype=object) and are stripped with str.strip, so
+# whitespace and the filter regexes behave exactly like they do per row
+# (pandas' .str accessor on object columns measured ~4x slower than a plain
+# comprehension for the same work).
+#
+# "auto" only picks this backend when pandas is installed and the body has
+# enough rows to pay for building the DataFrame (see bench_pandas_backend.py).
+
+BACKENDS = ("auto", "python", "pandas")
+PANDAS_MIN_ROWS = 5000
+
+
+def available():
+    return pd is not None
+
+
+def use_pandas(backend, csv_content):
+    if backend == "python" or pd is None:
+        return False
+    if backend == "pandas":
+        return True
+    # Newlines overcount rows with multi-line cells, which is fine for a threshold
+    newline = "\n" if isinstance(csv_content, str) else b"\n"
+    return csv_content.count(newline) >= PANDAS_MIN_ROWS
+
+
+def _read_columns(csv_content, columns, body_start):
+    body = csv_content[body_start:]
+    if isinstance(body, str):
+        source = StringIO(body)
+    else:
+        source = BytesIO(body)
+    frame = pd.read_csv(
+        source, header=None, usecols=columns, dtype=object, na_filter=False, keep_default_na=False,
+        skip_blank_lines=False, engine="c", encoding="utf-8", encoding_errors="replace",
+    )
+    # Cells missing from short or blank rows come back as NaN on some pandas
+    # versions even with na_filter off; the pure-Python path reads them as ""
+    return {i: [value.strip() for value in frame[i].fillna("").tolist()] for i in columns}
+
+
+def _filled(column, size):
+    return np.fromiter(map(bool, column), dtype=bool, count=size)
+
+
+def _check_mask(cells, kind, indexes, arg, size):
+    # True where the row passes the check
+    if kind == "missing":
+        return np.zeros(size, dtype=bool)
+    if kind == "all":
+        return np.logical_and.reduce([_filled(cells[i], size) for i in indexes])
+    if kind == "any":
+        return np.logical_or.reduce([_filled(cells[i], size) for i in indexes])
+    column = cells[indexes[0]]
+    if kind == "equals":
+        return np.fromiter((value.lower() == arg for value in column), dtype=bool, count=size)
+    found = np.fromiter((arg.search(value) is not None for value in column), dtype=bool, count=size)
+    return found if kind == "regex" else ~found
+
+
+def extract_frame(csv_content, column_plan, checks, body_start, stats):
+    # Returns the records of every data row from body_start on, or None when
+    # pandas cannot read the body as one table of str cells (the caller then
+    # falls back to the pure-Python path, which copes with any row shape)
+    columns = column_plan["columns"]
+    if body_start >= len(csv_content):
+        return []
+    try:
+        cells = _read_columns(csv_content, columns, body_start)
+    except Exception:
+        return None
+
+    size = len(cells[columns[0]])
+    stats["rows_scanned"] += size
+    plan = column_plan["plan"]
+
+    keep = _check_mask(cells, "any", [i for i, _ in plan], None, size)
+    rejected = [("blank", int(size - keep.sum()))]
+    for reason, kind, indexes, arg in checks:
+        passed = _check_mask(cells, kind, indexes, arg, size)
+        rejected.append((reason, int((keep & ~passed).sum())))
+        keep &= passed
+
+    filtered = stats["rows_filtered"]
+    for reason, count in rejected:
+        if count:
+            filtered[reason] = filtered.get(reason, 0) + count
+
+    selector = keep.tolist()
+    keys = [key for _, key in plan]
+    kept = [compress(cells[i], selector) for i, _ in plan]
+    records = [{key: value for key, value in zip(keys, values) if value} for values in zip(*kept)]
+    stats["rows_kept"] += len(records)
+    return records
@@ -0,0 +1,73 @@
+import json
+import os
+import threading
+import time
+
+# Timeline of the engine's stages in Chrome Trace Event format, for
+# chrome://tracing or https://ui.perfetto.dev.
+# The engine already takes perf_counter() timestamps around its stages for
+# the run report; record() turns a pair of them into a complete ("X") event
+# on the calling thread's row. While no trace is active, record() is a
+# global lookup and a None check, so leaving the calls in costs nothing
+# measurable. Spans the engine records:
+#   worksheet  one worksheet on a fetch worker (args: spreadsheet, gid, rows)
+#   fetch      download, including scheduler wait and retries
+#   header     header detection / check of the remembered layout
+#   extract    tokenizing, decoding the kept cells and building records
+#   validate, profile, sink   on the consuming thread, per worksheet
+#   wait       consuming thread blocked on the next worksheet in order
+#   write      final write of a spreadsheet's output file
+#
+#   run_manifest(..., {"trace": "trace.json"})  or  sheets_engine.py --trace trace.json
+
+TRACER = None
+
+
+class Tracer:
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events = []
+        self.threads = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, started, ended, args):
+        thread = threading.current_thread()
+        event = {
+            "name": name, "cat": "pipeline", "ph": "X", "pid": os.getpid(),
+            "ts": round((started - self.origin) * 1e6, 1), "dur": round((ended - started) * 1e6, 1),
+        }
+        if args:
+            event["args"] = args
+        with self.lock:
+            tid = self.threads.setdefault(thread.ident, (len(self.threads) + 1, thread.name))[0]
+            event["tid"] = tid
+            self.events.append(event)
+
+    def trace(self):
+        names = [
+            {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+            for tid, name in self.threads.values()
+        ]
+        return {"traceEvents": names + sorted(self.events, key=lambda e: e["ts"]), "displayTimeUnit": "ms"}
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.trace(), f, ensure_ascii=False)
+
+
+def start():
+    global TRACER
+    TRACER = Tracer()
+    return TRACER
+
+
+def stop():
+    global TRACER
+    tracer, TRACER = TRACER, None
+    return tracer
+
+
+def record(name, started, ended=None, **args):
+    tracer = TRACER
+    if tracer is not None:
+        tracer.add(name, started, time.perf_counter() if ended is None else ended, args)
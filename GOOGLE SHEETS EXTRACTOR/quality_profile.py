@@ -0,0 +1,279 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from collections import Counter
+
+from student_validation import EMAIL_KEYS, present_keys, resolve_keys
+
+# One-pass data-quality profile of roster records, in constant memory.
+# Records are fed to QualityProfile.add() as they stream past (from the
+# engine, the merger or iter_json_array over a file on disk), and nothing
+# is kept per record:
+#   fill rate        - non-blank count per column
+#   distinct values  - a HyperLogLog per column (2^11 registers, ~2.3% error)
+#   top values       - space-saving counters for nationality, level, location
+#                      and visa (counts are upper bounds, "error" is the slack)
+#   duplicate emails - emails seen minus the HyperLogLog distinct estimate,
+#                      plus the addresses space-saving can prove repeat
+# Memory is bounded by MAX_COLUMNS sketches of 2 KB each plus the counters.
+# add_many() works on batches of BATCH_ROWS records split into columns, so
+# each distinct value in a batch is hashed once and the top-value counters
+# take one weighted update per distinct value. The top-value columns and the
+# email keys are matched by normalised header ("NATIONALITY", "Email  Address"),
+# resolved once per batch like student_validation does.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INPUT = os.path.join(SCRIPT_DIR, "ALL THE STUDENTS 03-09-2025.json")
+PROFILE_FILENAME = "quality_report.json"
+
+HLL_PRECISION = 11
+SPACE_SAVING_CAPACITY = 64
+TOP_K = 10
+MAX_COLUMNS = 200
+BATCH_ROWS = 5000
+TOP_K_COLUMNS = ["Nationality", "Current CIEP Level", "Current Location", "Visa"]
+
+
+def hash64(text):
+    # Stable across processes (unlike hash()), so sketches can be compared between runs
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+        self.rest_bits = 64 - precision
+        self.rest_mask = (1 << self.rest_bits) - 1
+
+    def add(self, text):
+        h = hash64(text)
+        index = h >> self.rest_bits
+        rank = self.rest_bits - (h & self.rest_mask).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self):
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class SpaceSaving:
+    # Metwally et al.: at most capacity counters; a new item replaces the
+    # smallest one and inherits its count as its error bound
+    def __init__(self, capacity=SPACE_SAVING_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+
+    def add(self, item, count=1):
+        counts = self.counts
+        if item in counts:
+            counts[item] += count
+        elif len(counts) < self.capacity:
+            counts[item] = count
+            self.errors[item] = 0
+        else:
+            smallest = min(counts, key=counts.get)
+            floor = counts.pop(smallest)
+            del self.errors[smallest]
+            counts[item] = floor + count
+            self.errors[item] = floor
+
+    def top(self, k=TOP_K):
+        ranked = sorted(self.counts.items(), key=lambda item: -item[1])[:k]
+        return [{"value": item, "count": count, "error": self.errors[item]} for item, count in ranked]
+
+
+class QualityProfile:
+    def __init__(self):
+        self.records = 0
+        self.filled = {}
+        self.distinct = {}
+        self.top = {column: SpaceSaving() for column in TOP_K_COLUMNS}
+        self.emails = 0
+        self.email_distinct = HyperLogLog()
+        self.email_repeats = SpaceSaving()
+
+    def add(self, record):
+        self.add_many([record])
+
+    def add_many(self, records):
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= BATCH_ROWS:
+                self._add_batch(batch)
+                batch = []
+        if batch:
+            self._add_batch(batch)
+        return self
+
+    def _add_batch(self, batch):
+        self.records += len(batch)
+        columns = {}
+        for record in batch:
+            for column, value in record.items():
+                if value:
+                    columns.setdefault(column, []).append(value)
+        top_columns = {
+            spelling: column for column in TOP_K_COLUMNS for spelling in resolve_keys(columns, [column])
+        }
+
+        for column, values in columns.items():
+            if column.startswith("_"):
+                continue
+            texts = [text for text in (v.strip() if isinstance(v, str) else str(v) for v in values) if text]
+            if not texts:
+                continue
+            if column not in self.filled:
+                if len(self.filled) >= MAX_COLUMNS:
+                    continue
+                self.filled[column] = 0
+                self.distinct[column] = HyperLogLog()
+            self.filled[column] += len(texts)
+            counts = Counter(texts)
+            sketch = self.distinct[column]
+            for text in counts:
+                sketch.add(text)
+            if column in top_columns:
+                top = self.top[top_columns[column]]
+                for text, count in counts.items():
+                    top.add(text, count)
+
+        emails = _column_emails(batch)
+        self.emails += len(emails)
+        for email, count in Counter(emails).items():
+            self.email_distinct.add(email)
+            self.email_repeats.add(email, count)
+
+    def report(self):
+        records = self.records or 1
+        columns = {
+            column: {
+                "filled": count,
+                "fill_rate": round(count / records, 4),
+                "distinct_estimate": self.distinct[column].count(),
+            }
+            for column, count in sorted(self.filled.items(), key=lambda item: -item[1])
+        }
+        distinct_emails = min(self.email_distinct.count(), self.emails)
+        repeated = [
+            {"email": item["value"], "at_least": item["count"] - item["error"]}
+            for item in self.email_repeats.top(TOP_K) if item["count"] - item["error"] > 1
+        ]
+        return {
+            "records": self.records,
+            "columns": columns,
+            "top_values": {column: sketch.top() for column, sketch in self.top.items() if sketch.counts},
+            "emails": {
+                "seen": self.emails,
+                "distinct_estimate": distinct_emails,
+                "duplicate_estimate": self.emails - distinct_emails,
+                "repeated": repeated,
+            },
+        }
+
+
+def _column_emails(batch):
+    emails = []
+    keys = resolve_keys(present_keys(batch), EMAIL_KEYS)
+    for record in batch:
+        for key in keys:
+            email = record.get(key)
+            if email and str(email).strip():
+                emails.append(str(email).strip().lower())
+                break
+    return emails
+
+
+_SEPARATORS = re.compile(r"[\s,]*")
+
+
+def iter_json_array(path, chunk_size=1 << 20):
+    # Yields the objects of a top-level JSON array without loading the file
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} does not contain a JSON list")
+        pos = 1
+        eof = False
+        while True:
+            pos = _SEPARATORS.match(buffer, pos).end()
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                if pos >= len(buffer):
+                    raise json.JSONDecodeError("need more data", buffer, pos)
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield item
+            if pos > chunk_size:
+                buffer = buffer[pos:]
+                pos = 0
+
+
+def save_profile(path, report):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def _one_line(text):
+    return " ".join(text.split())
+
+
+def print_profile(report):
+    emails = report["emails"]
+    print(f"🔬 Profiled {report['records']} records, {len(report['columns'])} columns")
+    for column, stats in list(report["columns"].items())[:12]:
+        print(f"   {_one_line(column)[:28]:28s} fill {stats['fill_rate'] * 100:5.1f}%  "
+              f"~{stats['distinct_estimate']} distinct")
+    for column, top in report["top_values"].items():
+        print(f"   Top {column}: " + ", ".join(f"{_one_line(t['value'])} ({t['count']})" for t in top[:5]))
+    print(f"   Emails: {emails['seen']} seen, ~{emails['distinct_estimate']} distinct, "
+          f"~{emails['duplicate_estimate']} duplicates")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="One-pass quality profile of roster JSON files.")
+    parser.add_argument("inputs", nargs="*", default=[DEFAULT_INPUT])
+    parser.add_argument("--report", default=os.path.join(SCRIPT_DIR, PROFILE_FILENAME))
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    profile = QualityProfile()
+    for path in args.inputs:
+        profile.add_many(iter_json_array(path))
+    report = profile.report()
+    elapsed = time.perf_counter() - started
+
+    save_profile(args.report, report)
+    print_profile(report)
+    print(f"⏱️ {profile.records / max(elapsed, 1e-9):.0f} records/s")
+    print(f"📄 Quality report saved to: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
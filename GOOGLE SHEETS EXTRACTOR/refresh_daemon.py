@@ -0,0 +1,356 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import requests
+
+import sheets_engine
+from fetch_scheduler import MAX_CONCURRENCY, FetchScheduler
+from layout_cache import FINGERPRINT_FILENAME, LayoutCache
+from memory_budget import JsonListWriter
+from roster_aggregates import AGGREGATES_FILENAME, RosterAggregates
+from run_journal import content_hash
+from student_validation import validate_records
+
+# Long-running refresh of the manifest's outputs.
+# Instead of running every extractor and then the merger by hand, the daemon
+# stays up and keeps warm what a fresh run has to rebuild: the HTTP session
+# (and its connection pool) behind one fetch scheduler, the remembered sheet
+# layouts and header fingerprints, and every worksheet's extracted records.
+# Each refresh
+#   - reloads the manifest if the file changed (added/removed worksheets)
+#   - revalidates every worksheet: a conditional GET with If-None-Match when
+#     the server gave an ETag last time (304 = unchanged), otherwise the body
+#     is downloaded and compared with the content hash of the last one
+#   - re-parses and re-validates only the worksheets whose body changed
+#   - rewrites only the output files of spreadsheets with a changed worksheet,
+#     refreshes only their roster_aggregates contribution, and rewrites the
+#     merged "ALL THE STUDENTS <date>.json" only when something changed
+# The Sheets export endpoint does not always send an ETag, so without one a
+# refresh still downloads each worksheet (projected, so mostly the kept
+# columns); the saving is the parse, validation and writes.
+#
+# refresh_state.json keeps the URL, ETag and hash of every worksheet, and the
+# records of a restarted daemon are read back from the output files (grouped
+# by _worksheet_gid), so a restart does not download everything again.
+# Downloads are never chunked here, and the run-level engine options (memory
+# cap, resume, order, trace, profiling) have no meaning for a daemon, so its
+# command line only takes the options listed in build_arg_parser().
+#
+#   python refresh_daemon.py --interval 300 [--merged PATH] [--once]
+
+STATE_FILENAME = "refresh_state.json"
+DEFAULT_INTERVAL = 300
+
+
+def merged_filename(day=None):
+    # Dated like the merger's snapshots, so cohort_analytics picks them up
+    return f"ALL THE STUDENTS {(day or date.today()).strftime('%d-%m-%Y')}.json"
+
+
+def write_records(path, records):
+    writer = JsonListWriter(path)
+    writer.write_many(records)
+    writer.close()
+
+
+class RefreshDaemon:
+    def __init__(self, manifest_path, output_dir, options=None, merged_path=None, schemas=sheets_engine.SCHEMAS,
+                 only=None):
+        self.manifest_path = manifest_path
+        self.only = only
+        self.output_dir = output_dir
+        self.options = dict(sheets_engine.DEFAULT_OPTIONS, **(options or {}))
+        self.merged_path = merged_path
+        self.schemas = schemas
+        os.makedirs(output_dir, exist_ok=True)
+
+        self.session = requests.Session()
+        self.scheduler = None
+        if self.options["scheduler"]:
+            self.scheduler = FetchScheduler(self.options["rate"], maximum=self.options["max_concurrency"])
+            self.session = self.scheduler.session(self.session)
+        self.layouts_path = os.path.join(output_dir, sheets_engine.LAYOUTS_FILENAME)
+        self.layouts = sheets_engine.load_layouts(self.layouts_path)
+        self.layout_cache = None
+        if self.options["layout_cache"]:
+            self.layout_cache = LayoutCache(os.path.join(output_dir, FINGERPRINT_FILENAME))
+        self.aggregates = None
+        if self.options["aggregates"]:
+            self.aggregates = RosterAggregates(os.path.join(output_dir, AGGREGATES_FILENAME))
+
+        self.state_path = os.path.join(output_dir, STATE_FILENAME)
+        self.state = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        self.sheets = []
+        self.manifest_mtime = None
+        self.outputs = {}  # output filename -> records, in manifest order
+        self.worksheets = {}  # state key -> validated records of one worksheet
+        self.refreshes = 0
+        self._poll_manifest()
+        self._seed()
+
+    @staticmethod
+    def _key(sheet, gid):
+        return f"{sheet['spreadsheet_id']}:{gid}:{sheet.get('schema', 'roster')}"
+
+    def _poll_manifest(self):
+        mtime = os.stat(self.manifest_path).st_mtime_ns
+        if mtime == self.manifest_mtime:
+            return False
+        manifest = sheets_engine.load_manifest(self.manifest_path)
+        self.sheets = [sheet for sheet in manifest["spreadsheets"]
+                       if not self.only or sheet["spreadsheet_id"] in self.only]
+        self.manifest_mtime = mtime
+        return True
+
+    def _seed(self):
+        # Records of worksheets the state file vouches for, from the outputs on disk
+        for sheet in self.sheets:
+            path = os.path.join(self.output_dir, sheet["output"])
+            keys = [self._key(sheet, gid) for gid in sheet["gids"]]
+            if not os.path.exists(path) or not all(key in self.state for key in keys):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+            grouped = {}
+            for entry in records:
+                grouped.setdefault(entry.get("_worksheet_gid"), []).append(entry)
+            for gid, key in zip(sheet["gids"], keys):
+                self.worksheets[key] = grouped.get(gid, [])
+            self.outputs[sheet["output"]] = records
+
+    def _revalidate(self, sheet, gid):
+        # (records or None when unchanged/failed, new state entry, outcome, stats)
+        spreadsheet_id = sheet["spreadsheet_id"]
+        schema_name = sheet.get("schema", "roster")
+        schema = self.schemas[schema_name]
+        key = self._key(sheet, gid)
+        previous = self.state.get(key, {})
+        known = key in self.worksheets
+        part = sheets_engine.new_run_stats()
+        part["worksheets"] = 1
+
+        projection = self.options["projection"]
+        layout = self.layouts.get(f"{spreadsheet_id}:{gid}")
+        if layout and layout.get("schema") != schema_name:
+            layout = None
+        if layout and projection != "off":
+            url = sheets_engine.projected_url(spreadsheet_id, gid, layout, projection)
+        else:
+            layout = None
+            url = sheets_engine.export_url(spreadsheet_id, gid)
+        headers = {}
+        if known and previous.get("etag") and previous.get("url") == url:
+            headers["If-None-Match"] = previous["etag"]
+
+        try:
+            response = self.session.get(url, timeout=sheets_engine.REQUEST_TIMEOUT, headers=headers)
+            if response.status_code == 304:
+                return None, previous, "not_modified", part
+            if response.status_code != 200:
+                print(f"⚠️ Failed to fetch gid {gid} (HTTP {response.status_code})")
+                part["worksheets_failed"] = 1
+                return None, previous, "failed", part
+            body = response.content
+            part["bytes_downloaded"] += len(body)
+            body_hash = content_hash(body)
+            if known and previous.get("hash") == body_hash and previous.get("url") == url:
+                return None, dict(previous, etag=response.headers.get("ETag")), "same_hash", part
+
+            records = None
+            if layout is not None:
+                try:
+                    records = sheets_engine.extract_projected(
+                        body, schema, layout, projection, part, self.options["backend"]
+                    )
+                    part["worksheets_projected"] += 1
+                except sheets_engine.LayoutMismatch as e:
+                    print(f"   ↩️ {e} for gid {gid}, falling back to full export")
+                    part["layout_fallbacks"] += 1
+                    self.layouts.pop(f"{spreadsheet_id}:{gid}", None)
+                    fetched = {}
+                    records = sheets_engine.extract_worksheet(
+                        self.session, spreadsheet_id, gid, schema_name, schema, part, self.layouts,
+                        self.options, self.layout_cache, fetched,
+                    )
+                    if records is None:
+                        part["worksheets_failed"] = 1
+                        return None, previous, "failed", part
+                    # Revalidated against the projected URL from the next refresh on
+                    url, body_hash, response = None, fetched.get("content_hash"), None
+            else:
+                records, layout = sheets_engine.parse_worksheet(
+                    body, schema, part, self.layout_cache, schema_name, self.options["backend"]
+                )
+                layout["schema"] = schema_name
+                self.layouts[f"{spreadsheet_id}:{gid}"] = layout
+        except Exception as e:
+            print(f"⚠️ Error processing gid {gid}: {e}")
+            part["worksheets_failed"] = 1
+            return None, previous, "failed", part
+
+        if self.options["validate"]:
+            records, rejected, _ = validate_records(records)
+            part["rows_rejected"] += len(rejected)
+        for entry in records:
+            entry["_worksheet_gid"] = gid
+        etag = response.headers.get("ETag") if response is not None else None
+        return records, {"url": url, "etag": etag, "hash": body_hash}, "changed", part
+
+    def refresh(self):
+        started = time.perf_counter()
+        self.refreshes += 1
+        manifest_changed = self._poll_manifest()
+        sheets = self.sheets
+        tasks = [(sheet, gid) for sheet in sheets for gid in sheet["gids"]]
+        stats = sheets_engine.new_run_stats()
+        outcomes = {"not_modified": 0, "same_hash": 0, "changed": 0, "failed": 0}
+
+        with ThreadPoolExecutor(max_workers=max(1, self.options["workers"])) as pool:
+            results = list(pool.map(lambda task: self._revalidate(*task), tasks))
+
+        changed_outputs = set()
+        for (sheet, gid), (records, entry, outcome, part) in zip(tasks, results):
+            key = self._key(sheet, gid)
+            sheets_engine.merge_run_stats(stats, part)
+            outcomes[outcome] += 1
+            self.state[key] = entry
+            if records is not None:
+                self.worksheets[key] = records
+                changed_outputs.add(sheet["output"])
+                print(f"   🔄 {sheet['spreadsheet_id']} gid {gid}: {len(records)} rows")
+            elif key not in self.worksheets:
+                self.state.pop(key, None)
+
+        # Worksheets and spreadsheets no longer in the manifest
+        current = {self._key(sheet, gid) for sheet, gid in tasks}
+        for key in set(self.worksheets) - current:
+            del self.worksheets[key]
+        for key in set(self.state) - current:
+            del self.state[key]
+        outputs = [sheet["output"] for sheet in sheets]
+        for output in set(self.outputs) - set(outputs):
+            del self.outputs[output]
+            if self.aggregates is not None:
+                self.aggregates.remove_source(output)
+        if manifest_changed:
+            changed_outputs.update(output for output in outputs if output in self.outputs)
+
+        for sheet in sheets:
+            output = sheet["output"]
+            if output not in changed_outputs:
+                continue
+            records = []
+            for gid in sheet["gids"]:
+                records.extend(self.worksheets.get(self._key(sheet, gid), []))
+            if self.outputs.get(output) == records and os.path.exists(os.path.join(self.output_dir, output)):
+                changed_outputs.discard(output)
+                continue
+            self.outputs[output] = records
+            write_records(os.path.join(self.output_dir, output), records)
+            if self.aggregates is not None:
+                self.aggregates.replace_source(output, records)
+
+        merged_path = self.merged_path or os.path.join(self.output_dir, merged_filename())
+        if changed_outputs or manifest_changed or not os.path.exists(merged_path):
+            write_records(merged_path, (entry for sheet in sheets for entry in self.outputs.get(sheet["output"], [])))
+        self._save()
+        if self.scheduler is not None:
+            summary = self.scheduler.summary()
+            stats["fetch_retries"] = summary["retries"]
+            stats["fetch_throttled"] = summary["throttled"]
+
+        elapsed = time.perf_counter() - started
+        print(f"🔁 Refresh {self.refreshes}: {outcomes['changed']} of {len(tasks)} worksheets changed "
+              f"({outcomes['not_modified']} not modified, {outcomes['same_hash']} same content, "
+              f"{outcomes['failed']} failed), {len(changed_outputs)} outputs rewritten, "
+              f"{stats['bytes_downloaded'] / 1024:.1f} KB in {elapsed:.1f}s")
+        return dict(outcomes, outputs_written=len(changed_outputs), seconds=elapsed,
+                    bytes_downloaded=stats["bytes_downloaded"], rows_rejected=stats["rows_rejected"])
+
+    def _save(self):
+        sheets_engine.save_layouts(self.layouts_path, self.layouts)
+        if self.layout_cache is not None:
+            self.layout_cache.save()
+        if self.aggregates is not None:
+            self.aggregates.save()
+        with open(self.state_path + ".part", "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(self.state_path + ".part", self.state_path)
+
+    def run(self, interval=DEFAULT_INTERVAL, cycles=None):
+        while cycles is None or self.refreshes < cycles:
+            started = time.monotonic()
+            self.refresh()
+            if cycles is not None and self.refreshes >= cycles:
+                break
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Keep the manifest's outputs and merged roster up to date.")
+    parser.add_argument("--manifest", default=sheets_engine.DEFAULT_MANIFEST)
+    parser.add_argument("--output-dir", default=sheets_engine.SCRIPT_DIR)
+    parser.add_argument("--only", nargs="*", help="spreadsheet ids to watch (default: all)")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="seconds between refreshes")
+    parser.add_argument("--cycles", type=int, help="stop after this many refreshes (default: run until stopped)")
+    parser.add_argument("--once", dest="cycles", action="store_const", const=1, help="refresh once and exit")
+    parser.add_argument("--merged", help="merged output path (default: dated ALL THE STUDENTS file)")
+    parser.add_argument("--no-layout-cache", dest="layout_cache", action="store_false",
+                        help="always run header detection instead of using cached layout fingerprints")
+    parser.add_argument("--projection", choices=sheets_engine.PROJECTION_MODES, default="range",
+                        help="server-side projection for worksheets with a known layout")
+    parser.add_argument("--backend", choices=sheets_engine.BACKENDS, default="auto",
+                        help="body extraction backend; auto uses pandas for large exports when installed")
+    parser.add_argument("--no-validate", dest="validate", action="store_false",
+                        help="skip student field validation and normalisation")
+    parser.add_argument("--no-aggregates", dest="aggregates", action="store_false",
+                        help="do not update the materialised roster aggregates")
+    parser.add_argument("--workers", type=int, default=1, help="worksheets revalidated at once")
+    parser.add_argument("--no-scheduler", dest="scheduler", action="store_false",
+                        help="send requests directly, without rate limiting or retries on 429/503")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="requests per second per host (token bucket); 0 leaves it to AIMD and Retry-After")
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY,
+                        help="ceiling for the adaptive number of requests in flight per host")
+    parser.add_argument("--base-url", help="override the Google Sheets host, e.g. a local fake server")
+    return parser
+
+
+def options_from_args(args):
+    return {
+        "layout_cache": args.layout_cache,
+        "projection": args.projection,
+        "backend": args.backend,
+        "validate": args.validate,
+        "aggregates": args.aggregates,
+        "workers": args.workers,
+        "scheduler": args.scheduler,
+        "rate": args.rate,
+        "max_concurrency": args.max_concurrency,
+    }
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    if args.base_url:
+        sheets_engine.SHEETS_BASE_URL = args.base_url.rstrip("/")
+
+    daemon = RefreshDaemon(args.manifest, args.output_dir, options_from_args(args), args.merged,
+                           only=args.only)
+    print(f"♻️ Watching {args.manifest}: {len(daemon.worksheets)} worksheets restored, "
+          f"refreshing every {args.interval:g}s")
+    try:
+        daemon.run(args.interval, args.cycles)
+    except KeyboardInterrupt:
+        print("\n👋 Stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+from collections import Counter
+
+from student_dedupe import normalize_nationality
+from student_validation import resolve_keys
+
+# Materialised roster counts, kept up to date incrementally.
+# Every source (one extracted JSON file, named as in the manifest/merger)
+# contributes a small table of counts per dimension. The store keeps each
+# source's contribution next to the running totals, so re-extracting a source
+# only applies the difference between its old and new contribution, and
+# apply_delta() takes explicit added/removed rows when the caller knows them.
+# Queries read the totals directly: count() is a dict lookup, never a scan
+# of the merged archive.
+# Nationalities are folded through student_dedupe's alias table here as well
+# as in validation, so unvalidated input (--no-validate, other callers) does
+# not split "SAUDI" and "SAUDI ARABIA" into separate counts. Dimension keys
+# are matched by normalised header ("NATIONALITY", "Current  CIEP Level"),
+# resolved once per distinct set of record keys, so records can be streamed.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+AGGREGATES_FILENAME = "roster_aggregates.json"
+DEFAULT_STORE = os.path.join(SCRIPT_DIR, AGGREGATES_FILENAME)
+
+DIMENSIONS = {
+    "nationality": ["Nationality"],
+    "level": ["Current CIEP Level"],
+    "visa": ["Visa"],
+    "location": ["Current Location"],
+}
+SOURCE_DIMENSION = "source"
+BLANK = "(blank)"
+
+
+def label(value):
+    text = " ".join(str(value).split()).upper() if value is not None else ""
+    return text or BLANK
+
+
+def nationality_label(value):
+    return label(normalize_nationality(str(value)) if value is not None else None)
+
+
+LABELS = {"nationality": nationality_label}
+
+
+def _dimension_value(record, keys, labeller=label):
+    for key in keys:
+        value = record.get(key)
+        if value is not None and str(value).strip():
+            return labeller(value)
+    return BLANK
+
+
+def contribution(records):
+    tables = {dimension: Counter() for dimension in DIMENSIONS}
+    labellers = [(tables[dimension], LABELS.get(dimension, label)) for dimension in DIMENSIONS]
+    resolved = {}  # tuple of a record's keys -> each dimension's spellings in it
+    rows = 0
+    for record in records:
+        rows += 1
+        shape = tuple(record)
+        spellings = resolved.get(shape)
+        if spellings is None:
+            spellings = resolved[shape] = [resolve_keys(shape, keys) for keys in DIMENSIONS.values()]
+        for (table, labeller), keys in zip(labellers, spellings):
+            table[_dimension_value(record, keys, labeller)] += 1
+    return {"rows": rows, "tables": {dimension: dict(table) for dimension, table in tables.items()}}
+
+
+def _empty():
+    return {"rows": 0, "tables": {dimension: {} for dimension in DIMENSIONS}}
+
+
+def _add_into(target, part, sign):
+    target["rows"] += sign * part["rows"]
+    for dimension, table in part["tables"].items():
+        counts = target["tables"].setdefault(dimension, {})
+        for value, count in table.items():
+            total = counts.get(value, 0) + sign * count
+            if total:
+                counts[value] = total
+            else:
+                counts.pop(value, None)
+
+
+class RosterAggregates:
+    def __init__(self, path=None):
+        self.path = path
+        self.totals = _empty()
+        self.sources = {}
+        self.dirty = False
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            self.totals = stored["totals"]
+            self.sources = stored["sources"]
+
+    def replace_source(self, source, records):
+        # Re-extraction of a whole source; returns whether any count changed
+        new = contribution(records)
+        old = self.sources.get(source)
+        if old == new:
+            return False
+        if old is not None:
+            _add_into(self.totals, old, -1)
+        _add_into(self.totals, new, 1)
+        self.sources[source] = new
+        self.dirty = True
+        return True
+
+    def apply_delta(self, source, added=(), removed=()):
+        current = self.sources.setdefault(source, _empty())
+        for part, sign in ((contribution(added), 1), (contribution(removed), -1)):
+            if part["rows"]:
+                _add_into(current, part, sign)
+                _add_into(self.totals, part, sign)
+                self.dirty = True
+
+    def remove_source(self, source):
+        old = self.sources.pop(source, None)
+        if old is not None:
+            _add_into(self.totals, old, -1)
+            self.dirty = True
+
+    def total(self):
+        return self.totals["rows"]
+
+    def count(self, dimension, value):
+        if dimension == SOURCE_DIMENSION:
+            return self.sources.get(value, {}).get("rows", 0)
+        return self.totals["tables"].get(dimension, {}).get(LABELS.get(dimension, label)(value), 0)
+
+    def table(self, dimension, source=None):
+        if dimension == SOURCE_DIMENSION:
+            return {name: part["rows"] for name, part in self.sources.items()}
+        part = self.sources.get(source, _empty()) if source else self.totals
+        return dict(part["tables"].get(dimension, {}))
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"totals": self.totals, "sources": self.sources}, f, ensure_ascii=False, indent=2)
+        self.dirty = False
+
+
+def print_table(table, top=None, title=None):
+    ranked = sorted(table.items(), key=lambda item: (-item[1], item[0]))
+    if top:
+        ranked = ranked[:top]
+    if title:
+        print(title)
+    for value, count in ranked:
+        print(f"   {count:7d}  {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query or rebuild the materialised roster aggregates.")
+    parser.add_argument("--store", default=DEFAULT_STORE)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    show = commands.add_parser("show", help="print one aggregate table")
+    show.add_argument("dimension", choices=list(DIMENSIONS) + [SOURCE_DIMENSION])
+    show.add_argument("--source", help="restrict to one source file")
+    show.add_argument("--top", type=int)
+
+    count = commands.add_parser("count", help="print the count for one value")
+    count.add_argument("dimension", choices=list(DIMENSIONS) + [SOURCE_DIMENSION])
+    count.add_argument("value")
+
+    update = commands.add_parser("update", help="refresh the contribution of the given source JSON files")
+    update.add_argument("files", nargs="+")
+    args = parser.parse_args()
+
+    aggregates = RosterAggregates(args.store)
+    if args.command == "show":
+        title = f"📊 {args.dimension} ({aggregates.total()} rows)"
+        print_table(aggregates.table(args.dimension, args.source), args.top, title)
+    elif args.command == "count":
+        print(aggregates.count(args.dimension, args.value))
+    else:
+        for path in args.files:
+            with open(path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+            changed = aggregates.replace_source(os.path.basename(path), records)
+            print(f"{'🔄' if changed else '✅'} {os.path.basename(path)}: {len(records)} rows"
+                  f"{'' if changed else ' (unchanged)'}")
+        aggregates.save()
+        print(f"📄 Aggregates saved to: {args.store}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+# Checkpoint journal that lets an interrupted engine run pick up where it died.
+# run_journal.jsonl in the output directory is append-only, one JSON object
+# per line:
+#   {"event": "start", "run": id, "fingerprint": ...}
+#   {"event": "worksheet", "run": id, "spreadsheet_id", "gid", "schema",
+#    "hash": sha1 of the downloaded CSV, "records": cached file, "rows", "stats"}
+#   {"event": "finish", "run": id}
+# A worksheet's extracted records (before validation, which is cheap and
+# re-run) are written to run_journal_cache/<run>/ first and the line is
+# appended and fsynced after, so every line points at a complete file; a line
+# torn by a crash is ignored. A run that started but never finished is resumed
+# when the schemas fingerprint still matches: its worksheets are read back
+# from the cache instead of downloaded. A finished (or mismatching) run is
+# replaced by a fresh one and its cache removed.
+
+JOURNAL_FILENAME = "run_journal.jsonl"
+CACHE_DIRNAME = "run_journal_cache"
+
+
+def schemas_fingerprint(schemas):
+    text = json.dumps(schemas, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def content_hash(body):
+    return hashlib.sha1(body if isinstance(body, bytes) else body.encode("utf-8")).hexdigest()
+
+
+def read_journal(path):
+    events = []
+    if not os.path.exists(path):
+        return events
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+    return events
+
+
+def _end_line(path):
+    # A line torn by a crash would swallow the next one appended after it
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell():
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+
+def _safe_name(text):
+    return "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in str(text))
+
+
+class RunJournal:
+    def __init__(self, output_dir, fingerprint, resume=True):
+        self.path = os.path.join(output_dir, JOURNAL_FILENAME)
+        self.cache_root = os.path.join(output_dir, CACHE_DIRNAME)
+        self.lock = threading.Lock()
+        self.completed = {}
+        self.resumed = False
+
+        events = read_journal(self.path) if resume else []
+        start = next((e for e in reversed(events) if e.get("event") == "start"), None)
+        unfinished = start is not None and not any(
+            e.get("event") == "finish" and e.get("run") == start["run"] for e in events
+        )
+        if unfinished and start.get("fingerprint") == fingerprint:
+            self.run_id = start["run"]
+            self.resumed = True
+            _end_line(self.path)
+            for event in events:
+                if event.get("event") == "worksheet" and event.get("run") == self.run_id:
+                    key = (event["spreadsheet_id"], event["gid"], event["schema"])
+                    self.completed[key] = event
+        else:
+            self.run_id = uuid.uuid4().hex[:12]
+            shutil.rmtree(self.cache_root, ignore_errors=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"event": "start", "run": self.run_id, "fingerprint": fingerprint,
+                                    "time": int(time.time())}) + "\n")
+        self.cache_dir = os.path.join(self.cache_root, self.run_id)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def lookup(self, spreadsheet_id, gid, schema_name):
+        # (records, stats) saved by this run, or None
+        entry = self.completed.get((spreadsheet_id, gid, schema_name))
+        if entry is None:
+            return None
+        try:
+            with open(os.path.join(self.cache_root, entry["records"]), "r", encoding="utf-8") as f:
+                return json.load(f), entry["stats"]
+        except (OSError, ValueError):
+            return None
+
+    def record(self, spreadsheet_id, gid, schema_name, body_hash, records, stats):
+        name = f"{_safe_name(spreadsheet_id)}__{_safe_name(gid)}__{_safe_name(schema_name)}.json"
+        path = os.path.join(self.cache_dir, name)
+        with open(path + ".part", "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False)
+        os.replace(path + ".part", path)
+        entry = {
+            "event": "worksheet", "run": self.run_id, "spreadsheet_id": spreadsheet_id, "gid": gid,
+            "schema": schema_name, "hash": body_hash, "records": f"{self.run_id}/{name}",
+            "rows": len(records), "stats": stats,
+        }
+        self._append(entry)
+        with self.lock:
+            self.completed[(spreadsheet_id, gid, schema_name)] = entry
+
+    def finish(self):
+        self._append({"event": "finish", "run": self.run_id, "time": int(time.time())})
+        shutil.rmtree(self.cache_root, ignore_errors=True)
+
+    def _append(self, event):
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
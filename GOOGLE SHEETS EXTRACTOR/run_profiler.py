@@ -0,0 +1,204 @@
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+# CPU and memory profiles of an engine or merger run, split by stage.
+# Code marks its stages with `with run_profiler.stage("validate"):`; while no
+# profiler is running that is a global lookup returning a shared no-op.
+#   cpu     one cProfile per stage, enabled only while the stage runs;
+#           <prefix>cpu_profile.txt lists each stage's hottest functions
+#           (by own time) and <prefix>cpu_profile.prof holds all stages
+#           together for pstats / snakeviz
+#   memory  tracemalloc for the whole run; per stage the memory it left
+#           allocated and the largest rise during one call, plus the top
+#           allocation sites (our own lines, not stdlib internals) alive at
+#           the fullest checkpoint(), in <prefix>memory_profile.txt
+# cProfile follows one thread and tracemalloc's peak is process-wide, so
+# only stages on the thread that started the profiler are measured; the
+# engine runs worksheets one at a time while profiling. Timings under
+# either profiler are inflated and only good for comparing stages.
+
+PROFILER = None
+TOP_FUNCTIONS = 25
+TOP_ALLOCATIONS = 25
+MEMORY_FRAMES = 16
+
+
+class _NoStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_STAGE = _NoStage()
+
+
+class _Stage:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        profiler = self.profiler
+        self.entry = profiler._entry(self.name)
+        profiler.current = self.name
+        if profiler.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            profiler.peak = max(profiler.peak, peak)
+            tracemalloc.reset_peak()
+            self.before = current
+        if profiler.cpu:
+            self.entry["cpu"].enable()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        profiler = self.profiler
+        entry = self.entry
+        if profiler.cpu:
+            entry["cpu"].disable()
+        if profiler.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            profiler.peak = max(profiler.peak, peak)
+            entry["net_bytes"] += current - self.before
+            entry["rise_bytes"] = max(entry["rise_bytes"], peak - self.before)
+        entry["calls"] += 1
+        entry["seconds"] += elapsed
+        profiler.current = None
+        return False
+
+
+class RunProfiler:
+    def __init__(self, cpu=False, memory=False):
+        self.cpu = cpu
+        self.memory = memory
+        self.thread = threading.get_ident()
+        self.stages = {}
+        self.current = None
+        self.peak = 0
+        self.snapshot = None
+        self.snapshot_label = None
+        self.snapshot_bytes = 0
+        if memory:
+            tracemalloc.start(MEMORY_FRAMES)
+
+    def _entry(self, name):
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = {
+                "calls": 0, "seconds": 0.0, "net_bytes": 0, "rise_bytes": 0,
+                "cpu": cProfile.Profile() if self.cpu else None,
+            }
+        return entry
+
+    def stage(self, name):
+        # Nested stages count towards the outer one
+        if self.current is not None or threading.get_ident() != self.thread:
+            return NO_STAGE
+        return _Stage(self, name)
+
+    def checkpoint(self, label):
+        # Keeps a snapshot of the fullest moment seen so far
+        if not self.memory:
+            return
+        current = tracemalloc.get_traced_memory()[0]
+        if current > self.snapshot_bytes:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.snapshot_label = label
+            self.snapshot_bytes = current
+
+    def stop(self):
+        if self.memory:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+    def cpu_report(self):
+        out = io.StringIO()
+        out.write("CPU profile by stage (cProfile; wall-clock seconds, inflated by profiling)\n")
+        for name, entry in self.stages.items():
+            if not entry["calls"]:
+                continue
+            out.write(f"\n== {name}: {entry['calls']} calls, {entry['seconds']:.3f}s\n")
+            stats = pstats.Stats(entry["cpu"], stream=out)
+            stats.strip_dirs().sort_stats("tottime").print_stats(TOP_FUNCTIONS)
+        return out.getvalue()
+
+    def memory_report(self, root):
+        lines = ["Memory by stage (tracemalloc)",
+                 f"{'stage':<14} {'calls':>7} {'left allocated':>15} {'largest rise':>13}"]
+        for name, entry in self.stages.items():
+            lines.append(f"{name:<14} {entry['calls']:>7} {entry['net_bytes'] / 1024 / 1024:12.1f} MB "
+                         f"{entry['rise_bytes'] / 1024 / 1024:10.1f} MB")
+        lines.append(f"\nPeak traced memory: {self.peak / 1024 / 1024:.1f} MB")
+        if self.snapshot is not None:
+            lines.append(f"Top allocation sites alive at '{self.snapshot_label}' "
+                         f"({self.snapshot_bytes / 1024 / 1024:.1f} MB traced):")
+            for site, (size, count) in top_sites(self.snapshot, root)[:TOP_ALLOCATIONS]:
+                lines.append(f"   {size / 1024 / 1024:8.2f} MB  {count:>9} blocks  {site}")
+        return "\n".join(lines) + "\n"
+
+    def save(self, directory, prefix=""):
+        paths = []
+        if self.cpu:
+            path = os.path.join(directory, f"{prefix}cpu_profile.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.cpu_report())
+            paths.append(path)
+            profiles = [entry["cpu"] for entry in self.stages.values() if entry["calls"]]
+            if profiles:
+                combined = pstats.Stats(profiles[0])
+                for profile in profiles[1:]:
+                    combined.add(profile)
+                path = os.path.join(directory, f"{prefix}cpu_profile.prof")
+                combined.dump_stats(path)
+                paths.append(path)
+        if self.memory:
+            path = os.path.join(directory, f"{prefix}memory_profile.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.memory_report(os.path.dirname(os.path.abspath(__file__))))
+            paths.append(path)
+        return paths
+
+
+def top_sites(snapshot, root):
+    # Allocations grouped by the innermost frame under `root`, biggest first
+    sites = {}
+    for trace in snapshot.traces:
+        frames = trace.traceback
+        frame = next((f for f in reversed(frames) if f.filename.startswith(root)), frames[-1])
+        site = f"{os.path.basename(frame.filename)}:{frame.lineno}"
+        size, count = sites.get(site, (0, 0))
+        sites[site] = (size + trace.size, count + 1)
+    return sorted(sites.items(), key=lambda item: -item[1][0])
+
+
+def start(cpu=False, memory=False):
+    global PROFILER
+    PROFILER = RunProfiler(cpu, memory)
+    return PROFILER
+
+
+def stop():
+    global PROFILER
+    profiler, PROFILER = PROFILER, None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+
+def stage(name):
+    profiler = PROFILER
+    return NO_STAGE if profiler is None else profiler.stage(name)
+
+
+def checkpoint(label):
+    profiler = PROFILER
+    if profiler is not None:
+        profiler.checkpoint(label)
@@ -0,0 +1,109 @@
+import json
+import time
+
+# Per-worksheet timings of an engine run, saved as run_report.json.
+# Every worksheet's stats carry
+#   wait_seconds      scheduler queueing plus any throttled/failed attempts
+#                     before the response that was used
+#   ttfb_seconds      request sent -> response headers in (requests'
+#                     response.elapsed; on a new connection this includes DNS
+#                     and connect, which requests does not expose separately)
+#   download_seconds  headers in -> body read
+#   fetch_seconds     the whole fetch, including the three above
+#   header_seconds    header row detection (or the layout cache lookup)
+#   parse_seconds     tokenizing the body and building records; cells are
+#                     decoded from the bytes as they are kept, so decoding is
+#                     part of this
+#   validate_seconds  student_validation
+#   sink_seconds      handing records to the output sink (early writes under
+#                     a memory cap included); the final write of each output
+#                     file is reported per spreadsheet
+# Chunked downloads only report fetch_seconds. A worksheet is marked
+# "network" bound when its fetch took longer than header detection plus
+# parsing, else "parse".
+
+RUN_REPORT_FILENAME = "run_report.json"
+SLOWEST_ROWS = 10
+
+TIMINGS = ("wait_seconds", "ttfb_seconds", "download_seconds", "fetch_seconds", "header_seconds",
+           "parse_seconds", "validate_seconds", "sink_seconds")
+
+
+def timed_get(session, url, **kwargs):
+    # Returns the response and its timings; the response hook runs once the
+    # headers are in, before requests reads the body
+    marks = {}
+
+    def headers_received(response, *args, **hook_kwargs):
+        marks["headers"] = time.perf_counter()
+        marks["ttfb"] = response.elapsed.total_seconds()
+
+    started = time.perf_counter()
+    response = session.get(url, hooks={"response": headers_received}, **kwargs)
+    finished = time.perf_counter()
+    headers_at = marks.get("headers", finished)
+    ttfb = marks.get("ttfb", 0.0)
+    return response, {
+        "wait_seconds": max(0.0, headers_at - ttfb - started),
+        "ttfb_seconds": ttfb,
+        "download_seconds": finished - headers_at,
+        "fetch_seconds": finished - started,
+    }
+
+
+def add_timings(stats, timings):
+    for key, value in timings.items():
+        stats[key] += value
+
+
+def worksheet_entry(spreadsheet_id, gid, part):
+    busy = part["header_seconds"] + part["parse_seconds"]
+    entry = {
+        "spreadsheet_id": spreadsheet_id,
+        "gid": gid,
+        "failed": bool(part["worksheets_failed"]),
+        "resumed": bool(part["worksheets_resumed"]),
+        "bytes": part["bytes_downloaded"],
+        "rows_scanned": part["rows_scanned"],
+        "rows_kept": part["rows_kept"],
+        "rows_per_second": round(part["rows_scanned"] / busy) if busy else None,
+        "seconds": round(part["worksheet_seconds"] + part["validate_seconds"] + part["sink_seconds"], 4),
+        "bound": "network" if part["fetch_seconds"] > busy else "parse",
+    }
+    entry.update((key, round(part[key], 4)) for key in TIMINGS)
+    return entry
+
+
+def build_run_report(stats, worksheets, spreadsheets, options):
+    totals = {key: round(value, 4) if isinstance(value, float) else value for key, value in stats.items()}
+    return {
+        "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "options": options,
+        "totals": totals,
+        "spreadsheets": spreadsheets,
+        "worksheets": worksheets,
+    }
+
+
+def save_run_report(path, report):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def print_slowest(report, top=SLOWEST_ROWS):
+    ranked = sorted((w for w in report["worksheets"] if not w["resumed"]), key=lambda w: -w["seconds"])[:top]
+    if not ranked:
+        return
+    totals = report["totals"]
+    network = totals["fetch_seconds"]
+    parsing = totals["header_seconds"] + totals["parse_seconds"]
+    print(f"⏱️ Slowest worksheets (network {network:.2f}s, parsing {parsing:.2f}s, "
+          f"validation {totals['validate_seconds']:.2f}s, writing {totals['sink_seconds']:.2f}s in total)")
+    print(f"   {'spreadsheet':<20} {'gid':>11} {'total':>7} {'wait':>6} {'ttfb':>6} {'dl':>6} "
+          f"{'header':>6} {'parse':>6} {'valid':>6} {'sink':>6} {'rows/s':>8} {'KB':>8}  bound")
+    for w in ranked:
+        rate = f"{w['rows_per_second']:,}" if w["rows_per_second"] is not None else "-"
+        print(f"   {w['spreadsheet_id'][:20]:<20} {w['gid'][:11]:>11} {w['seconds']:7.2f} "
+              f"{w['wait_seconds']:6.2f} {w['ttfb_seconds']:6.2f} {w['download_seconds']:6.2f} "
+              f"{w['header_seconds']:6.3f} {w['parse_seconds']:6.3f} {w['validate_seconds']:6.3f} "
+              f"{w['sink_seconds']:6.3f} {rate:>8} {w['bytes'] / 1024:8.1f}  {w['bound']}")
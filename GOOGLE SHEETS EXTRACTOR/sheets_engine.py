@@ -0,0 +1,913 @@
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import chain
+from urllib.parse import urlencode
+
+import requests
+
+import pipeline_trace
+import run_profiler
+from chunked_download import DEFAULT_CHUNK_ROWS, fetch_chunked
+from csv_tokenizer import iter_projected_rows, read_rows
+from fetch_scheduler import MAX_CONCURRENCY, FetchScheduler
+from layout_cache import FINGERPRINT_FILENAME, LayoutCache, schema_key
+from memory_budget import FLUSH_FRACTION, MemoryBudget, SpreadsheetSink, estimate_bytes, peak_rss_mb
+from pandas_backend import BACKENDS, extract_frame, use_pandas
+from quality_profile import PROFILE_FILENAME, QualityProfile, iter_json_array, print_profile, save_profile
+from roster_aggregates import AGGREGATES_FILENAME, RosterAggregates
+from run_journal import RunJournal, content_hash, schemas_fingerprint
+from run_report import (
+    RUN_REPORT_FILENAME, add_timings, build_run_report, print_slowest, save_run_report, timed_get, worksheet_entry,
+)
+from student_validation import REPORT_FILENAME, add_to_report, new_report, print_report, save_report, validate_records
+from worksheet_history import HISTORY_FILENAME, WorksheetHistory, longest_first, predict_makespan
+
+# Shared extraction engine for the roster spreadsheets.
+# The per-spreadsheet "Sheets Data Extractor ..." scripts all fetch a CSV
+# export per worksheet, look for a header row near the top and keep a handful
+# of columns. This module does the same from one manifest and one schema table.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MANIFEST = os.path.join(SCRIPT_DIR, "extraction_manifest.json")
+
+SHEETS_BASE_URL = os.environ.get("SHEETS_BASE_URL", "https://docs.google.com")
+HEADER_SCAN_ROWS = 20
+REQUEST_TIMEOUT = 60
+
+# Once a worksheet's layout is known it is requested with a server-side
+# projection: "range" asks the export endpoint for A{header}:{last column},
+# "gviz" asks the query endpoint for just the needed columns. Any layout
+# mismatch in the response falls back to a full export.
+LAYOUTS_FILENAME = "sheet_layouts.json"
+PROJECTION_MODES = ("off", "range", "gviz")
+
+# chunk_rows > 0 downloads long worksheets as parallel row-range chunks.
+# backend "auto" hands large bodies to the pandas backend when it is installed.
+# validate runs student_validation over every worksheet's records; profile
+# streams the kept records through quality_profile's sketches; aggregates
+# refreshes each output file's contribution to roster_aggregates.
+# workers > 1 fetches and parses that many worksheets of a spreadsheet at once.
+# memory_mb > 0 caps parsed-but-unwritten records (see memory_budget): output
+# files are written as they fill up, and fetching pauses while over the cap.
+# scheduler routes every request through fetch_scheduler (per-host token
+# bucket at `rate` requests/s, 0 = no bucket; AIMD concurrency up to
+# max_concurrency; 429/503 retried after Retry-After).
+# Every run keeps a run_journal of finished worksheets; with resume, a run that
+# died part way is picked up without downloading those worksheets again.
+# Every run also writes run_report.json with per-worksheet network, parse,
+# validation and write timings (see run_report).
+# trace, when set to a path, records every stage as a span and writes a
+# Chrome trace of the run there (see pipeline_trace).
+# profile_cpu / profile_mem write per-stage cProfile and tracemalloc reports
+# next to the outputs (see run_profiler); worksheets then run one at a time.
+# order "longest" starts the worksheets with the longest past fetch + parse
+# time first when workers > 1 (see worksheet_history); "manifest" keeps the
+# manifest order. Output files are in manifest order either way.
+DEFAULT_OPTIONS = {
+    "layout_cache": True,
+    "projection": "range",
+    "chunk_rows": 0,
+    "chunk_workers": 4,
+    "backend": "auto",
+    "validate": True,
+    "profile": True,
+    "aggregates": True,
+    "workers": 1,
+    "memory_mb": 0,
+    "scheduler": True,
+    "rate": 0.0,
+    "max_concurrency": MAX_CONCURRENCY,
+    "resume": True,
+    "order": "longest",
+    "trace": None,
+    "profile_cpu": False,
+    "profile_mem": False,
+}
+
+# Row filters are evaluated on the raw cells of each data row, before any
+# record dict is built:
+#   required      - every listed column must be non-blank
+#   required_any  - at least one listed column must be non-blank
+#   equals        - column must equal the value (case-insensitive)
+#   regex         - column must match the pattern
+#   exclude_regex - row is dropped when the column matches the pattern
+# Column names are matched on normalized header text.
+SCHEMAS = {
+    "roster": {
+        "target_headers": [
+            "no.", "student id", "student name", "gender", "nationality",
+            "email", "email address", "visa", "current location", "remark",
+            "pass / repeat", "pass / fail / repeat"
+        ],
+        "row_filters": {
+            "required_any": ["email", "email address"],
+            "exclude_regex": {"student name": r"^(student name|teachers?\b|notes?\b|total\b)"},
+        },
+    },
+    "ciep": {
+        "target_headers": [
+            "student name", "gender", "nationality", "email", "current ciep level"
+        ],
+        "row_filters": {
+            "required_any": ["email", "email address"],
+            "exclude_regex": {"student name": r"^(student name|teachers?\b|notes?\b|total\b)"},
+        },
+    },
+}
+
+
+class LayoutMismatch(ValueError):
+    pass
+
+
+def normalize(text):
+    return re.sub(r"\s+", " ", text.strip().lower()) if text else ""
+
+
+def new_run_stats():
+    return {
+        "worksheets": 0,
+        "worksheets_failed": 0,
+        "rows_scanned": 0,
+        "rows_kept": 0,
+        "rows_filtered": {},
+        "worksheets_projected": 0,
+        "layout_fallbacks": 0,
+        "bytes_downloaded": 0,
+        "chunk_requests": 0,
+        "header_cache_hits": 0,
+        "header_cache_misses": 0,
+        "worksheets_vectorised": 0,
+        "rows_rejected": 0,
+        "sink_flushes": 0,
+        "worksheets_resumed": 0,
+        "worksheet_seconds": 0.0,
+        "wait_seconds": 0.0,
+        "ttfb_seconds": 0.0,
+        "download_seconds": 0.0,
+        "fetch_seconds": 0.0,
+        "header_seconds": 0.0,
+        "parse_seconds": 0.0,
+        "validate_seconds": 0.0,
+        "sink_seconds": 0.0,
+        "predicted_seconds": None,
+        "actual_seconds": None,
+        "fetch_retries": 0,
+        "fetch_throttled": 0,
+        "peak_in_flight_bytes": 0,
+        "peak_rss_mb": None,
+    }
+
+
+def merge_run_stats(stats, part):
+    for key, value in part.items():
+        if key == "rows_filtered":
+            for reason, count in value.items():
+                stats[key][reason] = stats[key].get(reason, 0) + count
+        elif isinstance(value, (int, float)):
+            stats[key] += value
+
+
+def count_filtered(stats, reason):
+    filtered = stats["rows_filtered"]
+    filtered[reason] = filtered.get(reason, 0) + 1
+
+
+def column_letter(index):
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+def export_url(spreadsheet_id, gid, a1_range=None):
+    url = f"{SHEETS_BASE_URL}/spreadsheets/d/{spreadsheet_id}/export?format=csv&gid={gid}"
+    if a1_range:
+        url += f"&range={a1_range}"
+    return url
+
+
+def gviz_url(spreadsheet_id, gid, a1_range, columns):
+    select = ", ".join(column_letter(c) for c in columns)
+    params = urlencode({
+        "tqx": "out:csv",
+        "gid": gid,
+        "headers": 0,
+        "range": a1_range,
+        "tq": f"select {select}",
+    })
+    return f"{SHEETS_BASE_URL}/spreadsheets/d/{spreadsheet_id}/gviz/tq?{params}"
+
+
+def projected_url(spreadsheet_id, gid, layout, mode):
+    # Rows from the header down, columns A up to the last one we read
+    a1_range = f"A{layout['header_row'] + 1}:{column_letter(max(layout['columns']))}"
+    if mode == "gviz":
+        return gviz_url(spreadsheet_id, gid, a1_range, layout["columns"])
+    return export_url(spreadsheet_id, gid, a1_range)
+
+
+def find_header_row(rows, target_headers, max_rows=HEADER_SCAN_ROWS):
+    targets = set(normalize(h) for h in target_headers)
+    best_index = -1
+    best_hits = 0
+
+    for i, row in enumerate(rows[:max_rows]):
+        hits = sum(1 for cell in row if normalize(cell) in targets)
+        if hits > best_hits:
+            best_hits = hits
+            best_index = i
+        if hits == len(targets):
+            break
+
+    return best_index
+
+
+def compile_header_plan(header, target_headers):
+    # (column position, output key) for every target column, first occurrence wins
+    targets = set(normalize(h) for h in target_headers)
+    plan = []
+    seen = set()
+    for i, cell in enumerate(header):
+        key = normalize(cell)
+        if key in targets and key not in seen:
+            seen.add(key)
+            plan.append((i, cell.strip()))
+    return plan
+
+
+def column_positions(header):
+    positions = {}
+    for i, cell in enumerate(header):
+        positions.setdefault(normalize(cell), i)
+    return positions
+
+
+def row_filter_names(row_filters):
+    names = list((row_filters or {}).get("required", []))
+    names += (row_filters or {}).get("required_any", [])
+    for key in ("equals", "regex", "exclude_regex"):
+        names += list((row_filters or {}).get(key, {}))
+    return [normalize(c) for c in names]
+
+
+def resolve_columns(header, schema):
+    # Column plan for one header row: the output columns, the positions the row
+    # filters read, and every column the tokenizer has to materialise
+    plan = compile_header_plan(header, schema["target_headers"])
+    positions = column_positions(header)
+    filter_positions = {
+        name: positions[name] for name in row_filter_names(schema.get("row_filters")) if name in positions
+    }
+    columns = sorted(set(i for i, _ in plan) | set(filter_positions.values()))
+    return {"plan": plan, "filter_positions": filter_positions, "columns": columns}
+
+
+def _cell(row, i):
+    return row[i] if i < len(row) else ""
+
+
+def row_filter_checks(row_filters, positions):
+    # positions maps normalized header text to column index.
+    # Returns (reason, kind, column indexes, argument) in evaluation order, or a
+    # single "missing" check when a column the filters need is not in the header
+    checks = []
+    missing = [("missing_column", "missing", [], None)]
+
+    required = row_filters.get("required", [])
+    if required:
+        indexes = [positions.get(normalize(c)) for c in required]
+        if any(i is None for i in indexes):
+            return missing
+        checks.append(("required", "all", indexes, None))
+
+    required_any = row_filters.get("required_any", [])
+    if required_any:
+        indexes = [positions[normalize(c)] for c in required_any if normalize(c) in positions]
+        if not indexes:
+            return missing
+        checks.append(("required", "any", indexes, None))
+
+    for column, value in row_filters.get("equals", {}).items():
+        i = positions.get(normalize(column))
+        if i is None:
+            return missing
+        checks.append(("equals", "equals", [i], value.strip().lower()))
+
+    for column, pattern in row_filters.get("regex", {}).items():
+        i = positions.get(normalize(column))
+        if i is None:
+            return missing
+        checks.append(("regex", "regex", [i], re.compile(pattern, re.IGNORECASE)))
+
+    for column, pattern in row_filters.get("exclude_regex", {}).items():
+        i = positions.get(normalize(column))
+        if i is None:
+            continue
+        checks.append(("excluded", "exclude", [i], re.compile(pattern, re.IGNORECASE)))
+
+    return checks
+
+
+def compile_row_filter(row_filters, positions):
+    # Returns a function row -> rejection reason (or None to keep the row)
+    if not row_filters:
+        return None
+
+    checks = []
+    for reason, kind, indexes, arg in row_filter_checks(row_filters, positions):
+        if kind == "missing":
+            return lambda row: "missing_column"
+        if kind == "all":
+            check = lambda row, idx=indexes: all(_cell(row, i).strip() for i in idx)
+        elif kind == "any":
+            check = lambda row, idx=indexes: any(_cell(row, i).strip() for i in idx)
+        elif kind == "equals":
+            check = lambda row, i=indexes[0], expected=arg: _cell(row, i).strip().lower() == expected
+        elif kind == "regex":
+            check = lambda row, i=indexes[0], compiled=arg: compiled.search(_cell(row, i).strip()) is not None
+        else:
+            check = lambda row, i=indexes[0], compiled=arg: compiled.search(_cell(row, i).strip()) is None
+        checks.append((reason, check))
+
+    def row_filter(row):
+        for reason, check in checks:
+            if not check(row):
+                return reason
+        return None
+
+    return row_filter
+
+
+def extract_rows(rows, plan, row_filter, stats):
+    extracted = []
+    for row in rows:
+        stats["rows_scanned"] += 1
+        if not any(_cell(row, i).strip() for i, _ in plan):
+            count_filtered(stats, "blank")
+            continue
+        if row_filter is not None:
+            reason = row_filter(row)
+            if reason:
+                count_filtered(stats, reason)
+                continue
+        entry = {}
+        for i, key in plan:
+            value = _cell(row, i).strip()
+            if value:
+                entry[key] = value
+        extracted.append(entry)
+    stats["rows_kept"] += len(extracted)
+    return extracted
+
+
+def _extract_body(csv_content, column_plan, buffered_rows, body_start, schema, stats, backend="auto"):
+    row_filters = schema.get("row_filters")
+    row_filter = compile_row_filter(row_filters, column_plan["filter_positions"])
+    if use_pandas(backend, csv_content):
+        checks = row_filter_checks(row_filters, column_plan["filter_positions"]) if row_filters else []
+        records = extract_frame(csv_content, column_plan, checks, body_start, stats)
+        if records is not None:
+            stats["worksheets_vectorised"] += 1
+            return extract_rows(buffered_rows, column_plan["plan"], row_filter, stats) + records
+    columns = column_plan["columns"]
+    data_rows = chain(buffered_rows, iter_projected_rows(csv_content, columns, body_start))
+    return extract_rows(data_rows, column_plan["plan"], row_filter, stats)
+
+
+def _cached_header(csv_content, cache_key, layout_cache):
+    # Walks the top rows one at a time until one matches a cached layout at
+    # the same position; rows below a cached header are never tokenized here
+    head = []
+    pos = 0
+    for i in range(HEADER_SCAN_ROWS):
+        rows, next_pos = read_rows(csv_content, 1, pos)
+        if not rows:
+            break
+        head.append(rows[0])
+        pos = next_pos
+        column_plan = layout_cache.lookup(cache_key, i, rows[0])
+        if column_plan is not None:
+            return head, pos, i, column_plan
+    return head, pos, -1, None
+
+
+def parse_worksheet(csv_content, schema, stats, layout_cache=None, schema_name="roster", backend="auto"):
+    # The top rows are tokenized in full for header detection; everything after
+    # them only has the planned and filtered columns materialised.
+    # Returns the records and the layout needed to project later requests.
+    started = time.perf_counter()
+    head, body_start, header_index, column_plan = [], 0, -1, None
+    if layout_cache is not None:
+        cache_key = schema_key(schema_name, schema)
+        head, body_start, header_index, column_plan = _cached_header(csv_content, cache_key, layout_cache)
+
+    if column_plan is not None:
+        stats["header_cache_hits"] += 1
+    else:
+        more, body_start = read_rows(csv_content, HEADER_SCAN_ROWS - len(head), body_start)
+        head += more
+        header_index = find_header_row(head, schema["target_headers"])
+        if header_index == -1:
+            raise ValueError("No header row found matching target headers")
+        column_plan = resolve_columns(head[header_index], schema)
+        if layout_cache is not None:
+            stats["header_cache_misses"] += 1
+            layout_cache.store(cache_key, header_index, head[header_index], column_plan)
+
+    header = head[header_index]
+    columns = column_plan["columns"]
+    detected = time.perf_counter()
+    stats["header_seconds"] += detected - started
+    records = _extract_body(csv_content, column_plan, head[header_index + 1:], body_start, schema, stats, backend)
+    extracted = time.perf_counter()
+    stats["parse_seconds"] += extracted - detected
+    pipeline_trace.record("header", started, detected)
+    pipeline_trace.record("extract", detected, extracted, rows=len(records))
+    layout = {
+        "header_row": header_index,
+        "columns": columns,
+        "headers": [normalize(_cell(header, c)) for c in columns],
+    }
+    return records, layout
+
+
+def extract_from_csv(csv_content, schema, stats, backend="auto"):
+    return parse_worksheet(csv_content, schema, stats, backend=backend)[0]
+
+
+def extract_projected(csv_content, schema, layout, mode, stats, backend="auto"):
+    # The first row of a projected response must be the remembered header
+    started = time.perf_counter()
+    head, body_start = read_rows(csv_content, 1)
+    if not head:
+        raise LayoutMismatch("empty response")
+    header = head[0]
+    if mode == "gviz":
+        found = [normalize(cell) for cell in header]
+    else:
+        found = [normalize(_cell(header, c)) for c in layout["columns"]]
+    if found != layout["headers"]:
+        raise LayoutMismatch("header row does not match remembered layout")
+    column_plan = resolve_columns(header, schema)
+    checked = time.perf_counter()
+    stats["header_seconds"] += checked - started
+    records = _extract_body(csv_content, column_plan, [], body_start, schema, stats, backend)
+    extracted = time.perf_counter()
+    stats["parse_seconds"] += extracted - checked
+    pipeline_trace.record("header", started, checked, projected=mode)
+    pipeline_trace.record("extract", checked, extracted, rows=len(records), projected=mode)
+    return records
+
+
+def fetch_csv(session, url, gid, stats):
+    started = time.perf_counter()
+    with run_profiler.stage("fetch"):
+        response, timings = timed_get(session, url, timeout=REQUEST_TIMEOUT)
+    add_timings(stats, timings)
+    pipeline_trace.record("fetch", started, status=response.status_code, bytes=len(response.content))
+    if response.status_code != 200:
+        print(f"⚠️ Failed to fetch gid {gid} (HTTP {response.status_code})")
+        return None
+    # Parsed straight from the response bytes; only kept cells get decoded
+    stats["bytes_downloaded"] += len(response.content)
+    return response.content
+
+
+def fetch_csv_chunked(session, range_url, first_row, gid, stats, options):
+    started = time.perf_counter()
+    try:
+        with run_profiler.stage("fetch"):
+            body, requests_made = fetch_chunked(
+                session, range_url, first_row, options["chunk_rows"], options["chunk_workers"],
+                timeout=REQUEST_TIMEOUT,
+            )
+    except Exception as e:
+        print(f"⚠️ Failed to fetch gid {gid} in chunks ({e})")
+        return None
+    stats["fetch_seconds"] += time.perf_counter() - started
+    stats["bytes_downloaded"] += len(body)
+    stats["chunk_requests"] += requests_made
+    pipeline_trace.record("fetch", started, bytes=len(body), chunks=requests_made)
+    return body
+
+
+def fetch_worksheet_csv(session, spreadsheet_id, gid, stats, options=DEFAULT_OPTIONS):
+    if options["chunk_rows"]:
+        range_url = lambda first, last: export_url(spreadsheet_id, gid, f"{first}:{last}")
+        return fetch_csv_chunked(session, range_url, 1, gid, stats, options)
+    return fetch_csv(session, export_url(spreadsheet_id, gid), gid, stats)
+
+
+def fetch_projected_csv(session, spreadsheet_id, gid, layout, stats, options):
+    mode = options["projection"]
+    if options["chunk_rows"] and mode == "range":
+        last_col = column_letter(max(layout["columns"]))
+        range_url = lambda first, last: export_url(spreadsheet_id, gid, f"A{first}:{last_col}{last}")
+        return fetch_csv_chunked(session, range_url, layout["header_row"] + 1, gid, stats, options)
+    return fetch_csv(session, projected_url(spreadsheet_id, gid, layout, mode), gid, stats)
+
+
+def extract_worksheet(session, spreadsheet_id, gid, schema_name, schema, stats, layouts,
+                      options=DEFAULT_OPTIONS, layout_cache=None, fetched=None):
+    # fetched, when given, receives the content_hash of the body the records came from
+    key = f"{spreadsheet_id}:{gid}"
+    projection = options["projection"]
+    layout = layouts.get(key)
+    if layout and layout.get("schema") != schema_name:
+        layout = None
+
+    if layout and projection != "off":
+        csv_content = fetch_projected_csv(session, spreadsheet_id, gid, layout, stats, options)
+        if csv_content is not None:
+            try:
+                with run_profiler.stage("parse"):
+                    records = extract_projected(csv_content, schema, layout, projection, stats, options["backend"])
+                stats["worksheets_projected"] += 1
+                if fetched is not None:
+                    fetched["content_hash"] = content_hash(csv_content)
+                return records
+            except LayoutMismatch as e:
+                print(f"   ↩️ {e} for gid {gid}, falling back to full export")
+        stats["layout_fallbacks"] += 1
+        layouts.pop(key, None)
+
+    csv_content = fetch_worksheet_csv(session, spreadsheet_id, gid, stats, options)
+    if csv_content is None:
+        return None
+    with run_profiler.stage("parse"):
+        records, layout = parse_worksheet(csv_content, schema, stats, layout_cache, schema_name, options["backend"])
+    layout["schema"] = schema_name
+    layouts[key] = layout
+    if fetched is not None:
+        fetched["content_hash"] = content_hash(csv_content)
+    return records
+
+
+# Row counts of a worksheet taken from the journal; network counters start at 0
+RESUMED_STATS = ("rows_scanned", "rows_kept", "rows_filtered")
+
+
+def _extract_task(session, spreadsheet_id, gid, schema_name, schema, layouts, options, layout_cache, budget,
+                  journal=None):
+    # May run on a fetch worker, so it counts into its own stats
+    part = new_run_stats()
+    part["worksheets"] = 1
+    saved = journal.lookup(spreadsheet_id, gid, schema_name) if journal is not None else None
+    if saved is not None:
+        records, saved_stats = saved
+        part.update((key, saved_stats[key]) for key in RESUMED_STATS if key in saved_stats)
+        part["worksheets_resumed"] = 1
+    else:
+        fetched = {}
+        started = time.perf_counter()
+        try:
+            records = extract_worksheet(
+                session, spreadsheet_id, gid, schema_name, schema, part, layouts, options, layout_cache, fetched
+            )
+        except Exception as e:
+            print(f"⚠️ Error processing gid {gid}: {e}")
+            records = None
+        ended = time.perf_counter()
+        part["worksheet_seconds"] = ended - started
+        pipeline_trace.record("worksheet", started, ended, spreadsheet=spreadsheet_id, gid=gid,
+                              rows=None if records is None else len(records))
+        if records is None:
+            part["worksheets_failed"] = 1
+            return None, part, 0
+        if journal is not None:
+            with run_profiler.stage("journal"):
+                journal.record(spreadsheet_id, gid, schema_name, fetched.get("content_hash"), records, part)
+    size = estimate_bytes(records) if budget.limit else 0
+    budget.charge(size)
+    return records, part, size
+
+
+def iter_worksheets(session, sheets, schemas, layouts, options, layout_cache, budget, journal=None, order=None):
+    # Yields (gid, records, stats, charged bytes) for every worksheet of every
+    # sheet, in manifest order. Up to options["workers"] worksheets run at
+    # once, started in `order` (indexes into the flattened worksheet list,
+    # default manifest order) and running ahead into later spreadsheets.
+    # Finished ones wait until it is their turn. Past FLUSH_FRACTION of the
+    # memory cap only one runs, and over the cap only the worksheet due next
+    # may start, so waiting results always drain.
+    def task(sheet, gid):
+        schema_name = sheet.get("schema", "roster")
+        return _extract_task(
+            session, sheet["spreadsheet_id"], gid, schema_name, schemas[schema_name],
+            layouts, options, layout_cache, budget, journal,
+        )
+
+    worksheets = [(sheet, gid) for sheet in sheets for gid in sheet["gids"]]
+    workers = options["workers"]
+    if workers <= 1:
+        for sheet, gid in worksheets:
+            print(f"📥 Fetching worksheet gid {gid} ...")
+            yield (gid,) + task(sheet, gid)
+        return
+
+    queue = list(order) if order is not None else list(range(len(worksheets)))
+    queue.reverse()  # popped from the end
+    futures = {}
+    due = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        def start(index):
+            sheet, gid = worksheets[index]
+            print(f"📥 Fetching worksheet gid {gid} ...")
+            futures[index] = pool.submit(task, sheet, gid)
+
+        while due < len(worksheets):
+            running = [future for future in futures.values() if not future.done()]
+            limit = 1 if budget.over(FLUSH_FRACTION) else workers
+            if len(running) < limit:
+                if budget.over():
+                    if due not in futures:
+                        queue.remove(due)
+                        start(due)
+                        continue
+                elif queue:
+                    start(queue.pop())
+                    continue
+            head = futures.get(due)
+            if head is not None and head.done():
+                del futures[due]
+                yield (worksheets[due][1],) + head.result()
+                due += 1
+                continue
+            wait(running, return_when=FIRST_COMPLETED)
+
+
+def load_layouts(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_layouts(path, layouts):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(layouts, f, ensure_ascii=False, indent=2)
+
+
+def load_manifest(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def print_run_stats(stats):
+    print(f"\n📊 Worksheets: {stats['worksheets']} ({stats['worksheets_failed']} failed)")
+    print(f"   Rows scanned: {stats['rows_scanned']}, kept: {stats['rows_kept']}")
+    if stats["header_cache_hits"] or stats["header_cache_misses"]:
+        print(f"   Header cache: {stats['header_cache_hits']} hits, {stats['header_cache_misses']} misses")
+    print(f"   Projected requests: {stats['worksheets_projected']} ({stats['layout_fallbacks']} fell back)")
+    if stats["worksheets_vectorised"]:
+        print(f"   Vectorised (pandas): {stats['worksheets_vectorised']} worksheets")
+    if stats["fetch_retries"] or stats["fetch_throttled"]:
+        print(f"   Throttled responses: {stats['fetch_throttled']} ({stats['fetch_retries']} retries)")
+    if stats["worksheets_resumed"]:
+        print(f"   Resumed from journal: {stats['worksheets_resumed']} worksheets")
+    if stats["sink_flushes"]:
+        print(f"   Early writes (memory cap): {stats['sink_flushes']}")
+    if stats["peak_in_flight_bytes"]:
+        print(f"   Peak unwritten records: ~{stats['peak_in_flight_bytes'] / 1024 / 1024:.1f} MB")
+    if stats["actual_seconds"] is not None:
+        print(f"   Run time: {stats['actual_seconds']:.1f}s (predicted {stats['predicted_seconds']:.1f}s)")
+    if stats["peak_rss_mb"] is not None:
+        print(f"   Peak RSS: {stats['peak_rss_mb']:.1f} MB")
+    print(f"   Downloaded: {stats['bytes_downloaded'] / 1024:.1f} KB")
+    for reason, count in sorted(stats["rows_filtered"].items()):
+        print(f"   Filtered ({reason}): {count}")
+
+
+def run_manifest(manifest, output_dir, options=None, schemas=SCHEMAS, only=None):
+    options = dict(DEFAULT_OPTIONS, **(options or {}))
+    stats = new_run_stats()
+    os.makedirs(output_dir, exist_ok=True)
+    if options["profile_cpu"] or options["profile_mem"]:
+        # Stages are profiled on this thread only
+        options["workers"] = 1
+        run_profiler.start(options["profile_cpu"], options["profile_mem"])
+    session = requests.Session()
+    scheduler = None
+    if options["scheduler"]:
+        # One scheduler for the whole manifest, so a learned limit carries over
+        scheduler = FetchScheduler(options["rate"], maximum=options["max_concurrency"])
+        session = scheduler.session(session)
+    layouts_path = os.path.join(output_dir, LAYOUTS_FILENAME)
+    layouts = load_layouts(layouts_path)
+    layout_cache = None
+    if options["layout_cache"]:
+        layout_cache = LayoutCache(os.path.join(output_dir, FINGERPRINT_FILENAME))
+    report = new_report() if options["validate"] else None
+    profile = QualityProfile() if options["profile"] else None
+    aggregates = None
+    if options["aggregates"]:
+        aggregates = RosterAggregates(os.path.join(output_dir, AGGREGATES_FILENAME))
+    budget = MemoryBudget(options["memory_mb"])
+    journal = RunJournal(output_dir, schemas_fingerprint(schemas), resume=options["resume"])
+    if journal.resumed:
+        print(f"♻️ Resuming unfinished run {journal.run_id}: {len(journal.completed)} worksheets already done")
+
+    sheets = [sheet for sheet in manifest["spreadsheets"] if not only or sheet["spreadsheet_id"] in only]
+    history = WorksheetHistory(os.path.join(output_dir, HISTORY_FILENAME))
+    estimates = [
+        0.0 if (sheet["spreadsheet_id"], gid, sheet.get("schema", "roster")) in journal.completed
+        else history.estimate(sheet["spreadsheet_id"], gid)
+        for sheet in sheets for gid in sheet["gids"]
+    ]
+    workers = max(1, options["workers"])
+    order = longest_first(estimates) if options["order"] == "longest" and workers > 1 else None
+    planned = [estimates[i] for i in order] if order is not None else estimates
+    stats["predicted_seconds"] = predict_makespan(planned, workers)
+    if order is not None:
+        print(f"⏱️ Longest worksheets first: predicted {stats['predicted_seconds']:.1f}s "
+              f"(manifest order {predict_makespan(estimates, workers):.1f}s)")
+    worksheet_report = []
+    spreadsheet_report = []
+    if options["trace"]:
+        pipeline_trace.start()
+    started = time.perf_counter()
+    worksheets = iter_worksheets(session, sheets, schemas, layouts, options, layout_cache, budget, journal, order)
+    for sheet in sheets:
+        spreadsheet_id = sheet["spreadsheet_id"]
+        print(f"\nProcessing spreadsheet: {spreadsheet_id} ({len(sheet['gids'])} worksheets)")
+        output_path = os.path.join(output_dir, sheet["output"])
+        sink = SpreadsheetSink(output_path, budget)
+
+        parts = []
+        for _ in sheet["gids"]:
+            waited = time.perf_counter()
+            gid, extracted, part, charged = next(worksheets)
+            pipeline_trace.record("wait", waited, gid=gid)
+            parts.append((gid, part))
+            if extracted is None:
+                continue
+            if not part["worksheets_resumed"]:
+                history.record(spreadsheet_id, gid, part["bytes_downloaded"], part["rows_kept"],
+                               part["worksheet_seconds"])
+            if report is not None:
+                checked = len(extracted)
+                validate_started = time.perf_counter()
+                with run_profiler.stage("validate"):
+                    extracted, rejected, flagged = validate_records(extracted)
+                part["validate_seconds"] = time.perf_counter() - validate_started
+                pipeline_trace.record("validate", validate_started, gid=gid, rejected=len(rejected))
+                add_to_report(report, checked, rejected, flagged, spreadsheet_id=spreadsheet_id, gid=gid)
+                part["rows_rejected"] += len(rejected)
+            if profile is not None:
+                profile_started = time.perf_counter()
+                with run_profiler.stage("quality"):
+                    profile.add_many(extracted)
+                pipeline_trace.record("profile", profile_started, gid=gid)
+            print(f"   → Extracted {len(extracted)} rows from gid {gid}")
+            for entry in extracted:
+                entry["_worksheet_gid"] = gid
+            sink_started = time.perf_counter()
+            with run_profiler.stage("sink"):
+                sink.add(extracted)
+            part["sink_seconds"] = time.perf_counter() - sink_started
+            pipeline_trace.record("sink", sink_started, gid=gid, rows=len(extracted))
+            budget.release(charged)
+
+        run_profiler.checkpoint(f"before writing {sheet['output']}")
+        close_started = time.perf_counter()
+        with run_profiler.stage("write"):
+            all_entries = sink.close()
+        write_seconds = time.perf_counter() - close_started
+        pipeline_trace.record("write", close_started, close_started + write_seconds, output=sheet["output"])
+        for gid, part in parts:
+            merge_run_stats(stats, part)
+            worksheet_report.append(worksheet_entry(spreadsheet_id, gid, part))
+        stats["sink_seconds"] += write_seconds
+        stats["sink_flushes"] += sink.flushes
+        spreadsheet_report.append({
+            "spreadsheet_id": spreadsheet_id, "output": sheet["output"], "rows": sink.writer.count,
+            "write_seconds": round(write_seconds, 4),
+        })
+        print(f"✅ Saved {sink.writer.count} rows to: {output_path}")
+        if aggregates is not None:
+            # Re-read from disk only when the cap made the sink write early
+            if all_entries is None:
+                all_entries = iter_json_array(output_path)
+            with run_profiler.stage("aggregates"):
+                aggregates.replace_source(sheet["output"], all_entries)
+
+    stats["actual_seconds"] = time.perf_counter() - started
+    tracer = pipeline_trace.stop()
+    if tracer is not None:
+        tracer.save(options["trace"])
+        print(f"📈 Trace of {len(tracer.events)} spans saved to: {options['trace']}")
+    history.save()
+    if scheduler is not None:
+        summary = scheduler.summary()
+        stats["fetch_retries"] = summary["retries"]
+        stats["fetch_throttled"] = summary["throttled"]
+    stats["peak_in_flight_bytes"] = budget.peak
+    stats["peak_rss_mb"] = peak_rss_mb()
+    save_layouts(layouts_path, layouts)
+    if aggregates is not None:
+        aggregates.save()
+    if layout_cache is not None:
+        layout_cache.save()
+    journal.finish()
+    profiler = run_profiler.stop()
+    if profiler is not None:
+        for path in profiler.save(output_dir, "engine_"):
+            print(f"📄 Profile: {path}")
+    run_report = build_run_report(stats, worksheet_report, spreadsheet_report, options)
+    save_run_report(os.path.join(output_dir, RUN_REPORT_FILENAME), run_report)
+    print_run_stats(stats)
+    print_slowest(run_report)
+    if report is not None:
+        save_report(os.path.join(output_dir, REPORT_FILENAME), report)
+        print_report(report)
+    if profile is not None:
+        quality = profile.report()
+        save_profile(os.path.join(output_dir, PROFILE_FILENAME), quality)
+        print_profile(quality)
+    return stats
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Extract student rosters from the spreadsheets in the manifest.")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--output-dir", default=SCRIPT_DIR)
+    parser.add_argument("--only", nargs="*", help="spreadsheet ids to process (default: all)")
+    parser.add_argument("--no-layout-cache", dest="layout_cache", action="store_false",
+                        help="always run header detection instead of using cached layout fingerprints")
+    parser.add_argument("--projection", choices=PROJECTION_MODES, default="range",
+                        help="server-side projection for worksheets with a known layout")
+    parser.add_argument("--chunk-rows", type=int, default=0,
+                        help=f"download long worksheets in parallel row chunks (e.g. {DEFAULT_CHUNK_ROWS}); 0 disables")
+    parser.add_argument("--chunk-workers", type=int, default=4)
+    parser.add_argument("--backend", choices=BACKENDS, default="auto",
+                        help="body extraction backend; auto uses pandas for large exports when installed")
+    parser.add_argument("--no-validate", dest="validate", action="store_false",
+                        help="skip student field validation and normalisation")
+    parser.add_argument("--no-profile", dest="profile", action="store_false",
+                        help="skip the streaming quality profile")
+    parser.add_argument("--no-aggregates", dest="aggregates", action="store_false",
+                        help="do not update the materialised roster aggregates")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worksheets of a spreadsheet fetched and parsed at once")
+    parser.add_argument("--memory-mb", type=float, default=0,
+                        help="cap on parsed records not yet written (e.g. 256 in a 512 MB container); 0 disables")
+    parser.add_argument("--no-scheduler", dest="scheduler", action="store_false",
+                        help="send requests directly, without rate limiting or retries on 429/503")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="requests per second per host (token bucket); 0 leaves it to AIMD and Retry-After")
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY,
+                        help="ceiling for the adaptive number of requests in flight per host")
+    parser.add_argument("--no-resume", dest="resume", action="store_false",
+                        help="start from scratch even if the last run did not finish")
+    parser.add_argument("--order", choices=["longest", "manifest"], default="longest",
+                        help="start order of worksheets when --workers > 1")
+    parser.add_argument("--trace", help="write a Chrome trace of the run's stages to this file "
+                                        "(open in chrome://tracing or ui.perfetto.dev)")
+    parser.add_argument("--profile-cpu", action="store_true",
+                        help="write per-stage cProfile reports (engine_cpu_profile.txt/.prof) to the output dir")
+    parser.add_argument("--profile-mem", action="store_true",
+                        help="write per-stage tracemalloc report (engine_memory_profile.txt) to the output dir")
+    parser.add_argument("--base-url", help="override the Google Sheets host, e.g. a local fake server")
+    return parser
+
+
+def options_from_args(args):
+    return {
+        "layout_cache": args.layout_cache,
+        "projection": args.projection,
+        "chunk_rows": args.chunk_rows,
+        "chunk_workers": args.chunk_workers,
+        "backend": args.backend,
+        "validate": args.validate,
+        "profile": args.profile,
+        "aggregates": args.aggregates,
+        "workers": args.workers,
+        "memory_mb": args.memory_mb,
+        "scheduler": args.scheduler,
+        "rate": args.rate,
+        "max_concurrency": args.max_concurrency,
+        "resume": args.resume,
+        "order": args.order,
+        "trace": args.trace,
+        "profile_cpu": args.profile_cpu,
+        "profile_mem": args.profile_mem,
+    }
+
+
+def main():
+    global SHEETS_BASE_URL
+    args = build_arg_parser().parse_args()
+    if args.base_url:
+        SHEETS_BASE_URL = args.base_url.rstrip("/")
+    run_manifest(load_manifest(args.manifest), args.output_dir, options_from_args(args), only=args.only)
+
+
+if __name__ == "__main__":
+    main()
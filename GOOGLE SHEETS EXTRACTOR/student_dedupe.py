@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import re
+import time
+import unicodedata
+import zlib
+from functools import lru_cache
+
+# Near-duplicate detection for student names in the merged archive.
+# Names are reduced to a circular character shingle set, so "WEI QIANDI",
+# "Wei Qian Di" and "QIANDI WEI" all land on (almost) the same shingles.
+# MinHash-LSH banding then proposes candidate pairs without comparing every
+# record against every other one.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INPUT = os.path.join(SCRIPT_DIR, "ALL THE STUDENTS 03-09-2025.json")
+DEFAULT_OUTPUT = os.path.join(SCRIPT_DIR, "near_duplicate_students.json")
+
+NAME_KEYS = ["Student Name", "Name"]
+NATIONALITY_KEYS = ["Nationality"]
+
+# Spellings seen in the rosters for the same country
+NATIONALITY_ALIASES = {
+    "chiina": "china",
+    "chinese": "china",
+    "saudi": "saudi arabia",
+    "sauda arabia": "saudi arabia",
+    "ksa": "saudi arabia",
+    "malaysian": "malaysia",
+    "m'sia": "malaysia",
+    "m'sian": "malaysia",
+    "msia": "malaysia",
+    "s. korea": "korea",
+    "s.korea": "korea",
+    "south korea": "korea",
+    "yemeni": "yemen",
+    "libyan": "libya",
+    "iraqi": "iraq",
+    "japanese": "japan",
+    "afghan": "afghanistan",
+}
+
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+NAME_WEIGHT = 0.85
+NATIONALITY_WEIGHT = 0.15
+
+_PARENTHETICAL = re.compile(r"\([^)]*\)")
+_NON_LETTERS = re.compile(r"[^\w\s]|_|\d")
+_SPACES = re.compile(r"\s+")
+
+
+def _permutations(count, seed=20250903):
+    # Deterministic (a, b) pairs so reports are stable between runs
+    state = seed
+    params = []
+    for _ in range(count):
+        state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+        a = (state >> 3) % (MERSENNE_PRIME - 1) + 1
+        state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+        b = (state >> 3) % MERSENNE_PRIME
+        params.append((a, b))
+    return params
+
+
+PERMUTATIONS = _permutations(NUM_PERMUTATIONS)
+
+
+def first_value(entry, keys):
+    for key in keys:
+        value = entry.get(key)
+        if value and str(value).strip():
+            return str(value)
+    return ""
+
+
+@lru_cache(maxsize=None)
+def normalize_name(name):
+    # Nicknames in brackets, e.g. "NIU YIDI (Heidi)", are not part of the legal name
+    text = unicodedata.normalize("NFKC", name or "")
+    text = _PARENTHETICAL.sub(" ", text)
+    text = _NON_LETTERS.sub(" ", text.casefold())
+    return _SPACES.sub(" ", text).strip()
+
+
+@lru_cache(maxsize=None)
+def normalize_nationality(nationality):
+    text = _SPACES.sub(" ", unicodedata.normalize("NFKC", nationality or "").strip().casefold())
+    return NATIONALITY_ALIASES.get(text, text)
+
+
+@lru_cache(maxsize=None)
+def name_shingles(normalized):
+    # Spaces are dropped and the string is treated as circular, so swapping
+    # family and given name (a rotation) or re-spacing pinyin keeps the shingles
+    squashed = normalized.replace(" ", "")
+    if not squashed:
+        return frozenset()
+    if len(squashed) <= SHINGLE_SIZE:
+        return frozenset([squashed])
+    wrapped = squashed + squashed[:SHINGLE_SIZE - 1]
+    return frozenset(wrapped[i:i + SHINGLE_SIZE] for i in range(len(squashed)))
+
+
+@lru_cache(maxsize=None)
+def minhash_signature(shingles):
+    hashed = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+    return tuple(
+        min(((a * h + b) % MERSENNE_PRIME) & MAX_HASH for h in hashed)
+        for a, b in PERMUTATIONS
+    )
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def load_records(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, list):
+        raise ValueError(f"{path} does not contain a JSON list")
+    return data
+
+
+def prepare(records):
+    prepared = []
+    for index, entry in enumerate(records):
+        name = normalize_name(first_value(entry, NAME_KEYS))
+        # Header rows that slipped into the archive are not students
+        if not name or name == "student name":
+            continue
+        shingles = name_shingles(name)
+        prepared.append({
+            "index": index,
+            "name": name,
+            "nationality": normalize_nationality(first_value(entry, NATIONALITY_KEYS)),
+            "shingles": shingles,
+            "signature": minhash_signature(shingles),
+        })
+    return prepared
+
+
+def candidate_pairs(prepared):
+    buckets = {}
+    for position, item in enumerate(prepared):
+        signature = item["signature"]
+        for band in range(BANDS):
+            start = band * ROWS_PER_BAND
+            key = (band,) + signature[start:start + ROWS_PER_BAND]
+            buckets.setdefault(key, []).append(position)
+
+    pairs = set()
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        for i in range(len(members)):
+            for j in range(i + 1, len(members)):
+                pairs.add((members[i], members[j]))
+    return pairs
+
+
+def nationality_similarity(a, b):
+    if not a or not b:
+        return 0.5
+    return 1.0 if a == b else 0.0
+
+
+def summarize(entry, index):
+    summary = {"index": index}
+    for key in ("Student ID", "Student Name", "Nationality", "Email", "Email Address", "_worksheet_gid"):
+        if entry.get(key):
+            summary[key] = entry[key]
+    return summary
+
+
+def find_near_duplicates(records, threshold=0.6, skip_exact=False):
+    prepared = prepare(records)
+    pairs = candidate_pairs(prepared)
+
+    results = []
+    for i, j in pairs:
+        a, b = prepared[i], prepared[j]
+        if skip_exact and a["name"] == b["name"]:
+            continue
+        name_score = jaccard(a["shingles"], b["shingles"])
+        nationality_score = nationality_similarity(a["nationality"], b["nationality"])
+        score = NAME_WEIGHT * name_score + NATIONALITY_WEIGHT * nationality_score
+        if score < threshold:
+            continue
+        results.append({
+            "score": round(score, 4),
+            "name_similarity": round(name_score, 4),
+            "nationality_match": nationality_score == 1.0,
+            "exact_name": a["name"] == b["name"],
+            "a": summarize(records[a["index"]], a["index"]),
+            "b": summarize(records[b["index"]], b["index"]),
+        })
+
+    results.sort(key=lambda r: (-r["score"], r["a"]["index"], r["b"]["index"]))
+    return results, len(prepared), len(pairs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-duplicate students in a merged roster archive.")
+    parser.add_argument("input", nargs="?", default=DEFAULT_INPUT)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--skip-exact", action="store_true",
+                        help="leave out pairs whose normalised names are identical")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    records = load_records(args.input)
+    results, considered, candidates = find_near_duplicates(records, args.threshold, args.skip_exact)
+    elapsed = time.perf_counter() - started
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    print(f"\n✅ Checked {considered} named records ({candidates} candidate pairs) in {elapsed:.2f}s")
+    print(f"🔎 Found {len(results)} pairs scoring >= {args.threshold}")
+    print(f"📄 Review file saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+import argparse
+import json
+import os
+import re
+import time
+import unicodedata
+from functools import lru_cache
+
+from student_dedupe import normalize_nationality
+
+# Validation and normalisation of the student fields in extracted rows.
+# A batch of records is split into one column per field, and every distinct
+# value in a column is normalised and checked once: genders and
+# nationalities repeat thousands of times, and the results are mapped back
+# onto the rows. Normalised values are written back into the kept records.
+#
+#   Email       NFKC (full-width letters, "＠", "．"), spaces removed, lower
+#               case. Cells holding several addresses ("a@qq.com; b@163.com")
+#               keep the first in place and the rest under "Other Emails".
+#   Student ID  e.g. 2025JB00092 (year, two-letter campus, five digits)
+#   Gender      M / F from M, MALE, 男, F, FEMALE, 女 in any case
+#   Nationality alias-folded country name in upper case, e.g. "S.KOREA" -> KOREA
+#
+# Rows without a usable email, and repeated header rows, are rejected: they go
+# to the report instead of flowing into the merged archive. A bad Student ID,
+# gender or nationality only flags the row; it is kept with the raw value, so
+# a real student is not lost to a typo in a secondary column.
+#
+# Output keys keep each sheet's own header text ("EMAIL", "Email  Address"),
+# so the field keys are matched the way sheets_engine matches headers:
+# stripped, whitespace collapsed, lower case. They are resolved once per
+# batch against the keys the batch actually has.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INPUT = os.path.join(SCRIPT_DIR, "ALL THE STUDENTS 03-09-2025.json")
+REPORT_FILENAME = "validation_report.json"
+BATCH_ROWS = 20000
+REPORT_SAMPLE = 2000
+
+EMAIL_KEYS = ["Email", "Email Address", "E-mail", "E-mail Address"]
+STUDENT_ID_KEYS = ["Student ID"]
+GENDER_KEYS = ["Gender"]
+NATIONALITY_KEYS = ["Nationality"]
+OTHER_EMAILS_KEY = "Other Emails"
+
+_EMAIL = re.compile(r"[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*@(?:[a-z0-9-]+\.)+[a-z]{2,}")
+_EMAIL_SEPARATORS = re.compile(r"[,;\n]+")
+_SPACES = re.compile(r"\s+")
+_STUDENT_ID = re.compile(r"(20\d\d)([A-Z]{2})(\d{5})")
+_ID_NOISE = re.compile(r"[\s\-_/.]+")
+_NATIONALITY = re.compile(r"[a-z][a-z .'&()-]*[a-z)]")
+
+GENDERS = {
+    "m": "M", "male": "M", "man": "M", "boy": "M", "男": "M",
+    "f": "F", "female": "F", "woman": "F", "girl": "F", "女": "F",
+}
+
+# Repeated header rows of merged class tabs carry the column titles as values
+HEADER_VALUES = {"email", "email address", "e-mail", "e-mail address", "student id", "gender", "nationality",
+                 "student name"}
+
+
+def _nfkc(value):
+    # Most cells are plain ASCII and NFKC would leave them unchanged
+    return value if value.isascii() else unicodedata.normalize("NFKC", value).replace("。", ".")
+
+
+def check_email(value):
+    # Returns (primary, others, reason)
+    text = _nfkc(value).strip().lower()
+    if not text:
+        return None, None, "email_missing"
+    if text in HEADER_VALUES:
+        return None, None, "header_row"
+    found = []
+    for part in _EMAIL_SEPARATORS.split(text):
+        # Stray spaces inside one address are dropped; a part with several
+        # "@" is taken as space-separated addresses
+        squashed = _SPACES.sub("", part)
+        candidates = [squashed] if squashed.count("@") <= 1 else part.split()
+        for address in candidates:
+            address = address.strip(".")
+            if _EMAIL.fullmatch(address) and address not in found:
+                found.append(address)
+    if not found:
+        return None, None, "email_invalid"
+    return found[0], "; ".join(found[1:]) or None, None
+
+
+# The optional fields return (normalised value, reason); (None, None) when blank
+
+def check_student_id(value):
+    text = _ID_NOISE.sub("", _nfkc(value).upper())
+    if not text:
+        return None, None
+    if text.lower() in HEADER_VALUES:
+        return None, "header_row"
+    if not _STUDENT_ID.fullmatch(text):
+        return None, "student_id_invalid"
+    return text, None
+
+
+def check_gender(value):
+    text = _nfkc(value).strip().lower()
+    if not text:
+        return None, None
+    if text in HEADER_VALUES:
+        return None, "header_row"
+    gender = GENDERS.get(text)
+    if gender is None:
+        return None, "gender_invalid"
+    return gender, None
+
+
+def check_nationality(value):
+    text = normalize_nationality(value)
+    if not text:
+        return None, None
+    if text in HEADER_VALUES:
+        return None, "header_row"
+    if len(text) < 2 or not _NATIONALITY.fullmatch(text):
+        return None, "nationality_invalid"
+    return text.upper(), None
+
+
+OPTIONAL_FIELDS = (
+    (STUDENT_ID_KEYS, lambda values: _checked_student_ids(values)),
+    (GENDER_KEYS, lambda values: _checked(values, check_gender)),
+    (NATIONALITY_KEYS, lambda values: _checked(values, check_nationality)),
+)
+
+
+@lru_cache(maxsize=4096)
+def field_key(text):
+    # Header text compared the way sheets_engine matches headers
+    return _SPACES.sub(" ", text.strip().lower())
+
+
+@lru_cache(maxsize=None)
+def _ranks(keys):
+    return {field_key(key): rank for rank, key in enumerate(keys)}
+
+
+def present_keys(records):
+    present = set()
+    for entry in records:
+        present.update(entry)
+    return present
+
+
+def resolve_keys(present, keys):
+    # Spellings of keys found among present (a batch's keys, or one record),
+    # in the order of keys
+    wanted = _ranks(tuple(keys))
+    found = [(wanted[field_key(key)], key) for key in present
+             if isinstance(key, str) and field_key(key) in wanted]
+    return [key for _, key in sorted(found)]
+
+
+def first_value(record, keys):
+    # First non-blank value among keys, matched by normalised key; None when there is none
+    for key in resolve_keys(record, keys):
+        value = record.get(key)
+        if value is not None and str(value).strip():
+            return value
+    return None
+
+
+def _column(records, keys):
+    # Value of the first non-blank key per record as str, "" when there is none
+    if not keys:
+        return [""] * len(records)
+    values = [entry.get(keys[0]) for entry in records]
+    for key in keys[1:]:
+        values = [value or entry.get(key) for value, entry in zip(values, records)]
+    return [value if isinstance(value, str) else str(value) if value else "" for value in values]
+
+
+def _checked(values, check):
+    # Each distinct value is checked once
+    results = {value: check(value) for value in set(values)}
+    return [results[value] for value in values]
+
+
+# Values that already match the strict pattern, the vast majority, cost one
+# regex pass over the column; the rest (None) go through the full check once each
+
+def _fill_slow(results, values, check):
+    slow = {}
+    for row in [row for row, result in enumerate(results) if result is None]:
+        value = values[row]
+        if value not in slow:
+            slow[value] = check(value)
+        results[row] = slow[value]
+    return results
+
+
+def _checked_emails(values):
+    texts = [value.strip().lower() for value in values]
+    results = [(text, None, None) if plain else None for text, plain in zip(texts, map(_EMAIL.fullmatch, texts))]
+    return _fill_slow(results, values, check_email)
+
+
+def _checked_student_ids(values):
+    results = [(value, None) if plain else None for value, plain in zip(values, map(_STUDENT_ID.fullmatch, values))]
+    return _fill_slow(results, values, check_student_id)
+
+
+def _source_keys(records, keys):
+    # Which of keys each record's value was read from
+    if not keys:
+        return [None] * len(records)
+    if len(keys) == 1:
+        return keys * len(records)
+    sources = [keys[0] if entry.get(keys[0]) else None for entry in records]
+    for key in keys[1:]:
+        sources = [source or (key if entry.get(key) else None) for source, entry in zip(sources, records)]
+    return sources
+
+
+def validate_batch(records):
+    # Returns (kept records, rejected [(record, reasons)], flagged [(record, reasons)])
+    present = present_keys(records)
+    email_keys = resolve_keys(present, EMAIL_KEYS)
+    emails = _checked_emails(_column(records, email_keys))
+    columns = []
+    for field_keys, check_column in OPTIONAL_FIELDS:
+        keys = resolve_keys(present, field_keys)
+        columns.append((keys, check_column(_column(records, keys))))
+
+    # Problems are gathered column by column; most rows have none
+    problems = {}
+    for results, position in [(emails, 2)] + [(results, 1) for _, results in columns]:
+        for row in [row for row, result in enumerate(results) if result[position]]:
+            problems.setdefault(row, []).append(results[row][position])
+    rejected_rows = set(row for row, reasons in problems.items() if emails[row][2] or "header_row" in reasons)
+    kept_rows = [row for row in range(len(records)) if row not in rejected_rows]
+
+    sources = _source_keys(records, email_keys)
+    for row in kept_rows:
+        primary, others, _ = emails[row]
+        records[row][sources[row]] = primary
+        if others:
+            records[row][OTHER_EMAILS_KEY] = others
+    for keys, results in columns:
+        sources = _source_keys(records, keys)
+        for row in kept_rows:
+            value = results[row][0]
+            if value is not None:
+                records[row][sources[row]] = value
+
+    kept = [records[row] for row in kept_rows]
+    rejected = [(records[row], sorted(set(problems[row]))) for row in sorted(rejected_rows)]
+    flagged = [(records[row], sorted(set(reasons))) for row, reasons in sorted(problems.items())
+               if row not in rejected_rows]
+    return kept, rejected, flagged
+
+
+def validate_records(records, batch_rows=BATCH_ROWS):
+    kept = []
+    rejected = []
+    flagged = []
+    for start in range(0, len(records), batch_rows):
+        batch_kept, batch_rejected, batch_flagged = validate_batch(records[start:start + batch_rows])
+        kept.extend(batch_kept)
+        rejected.extend(batch_rejected)
+        flagged.extend(batch_flagged)
+    return kept, rejected, flagged
+
+
+def new_report():
+    return {"rows_checked": 0, "rows_rejected": 0, "rows_flagged": 0, "by_reason": {}, "rows": []}
+
+
+def add_to_report(report, checked, rejected, flagged, **source):
+    report["rows_checked"] += checked
+    report["rows_rejected"] += len(rejected)
+    report["rows_flagged"] += len(flagged)
+    for action, issues in (("rejected", rejected), ("flagged", flagged)):
+        for entry, reasons in issues:
+            for reason in reasons:
+                report["by_reason"][reason] = report["by_reason"].get(reason, 0) + 1
+            if len(report["rows"]) < REPORT_SAMPLE:
+                report["rows"].append(dict(source, action=action, reasons=reasons, record=entry))
+    return report
+
+
+def save_report(path, report):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def print_report(report):
+    print(f"🧹 Validated {report['rows_checked']} rows: "
+          f"{report['rows_rejected']} rejected, {report['rows_flagged']} flagged")
+    for reason, count in sorted(report["by_reason"].items()):
+        print(f"   {reason}: {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and normalise student fields in a roster JSON file.")
+    parser.add_argument("input", nargs="?", default=DEFAULT_INPUT)
+    parser.add_argument("--output", help="where to write the kept records (default: only report)")
+    parser.add_argument("--report", default=os.path.join(SCRIPT_DIR, REPORT_FILENAME))
+    args = parser.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        records = json.load(f)
+
+    started = time.perf_counter()
+    kept, rejected, flagged = validate_records(records)
+    elapsed = time.perf_counter() - started
+
+    report = add_to_report(new_report(), len(records), rejected, flagged)
+    save_report(args.report, report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(kept, f, ensure_ascii=False, indent=2)
+        print(f"✅ Saved {len(kept)} rows to: {args.output}")
+
+    print_report(report)
+    print(f"⏱️ {len(records) / max(elapsed, 1e-9):.0f} rows/s")
+    print(f"📄 Rejection report saved to: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
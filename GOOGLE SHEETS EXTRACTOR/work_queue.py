@@ -0,0 +1,294 @@
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+import requests
+
+import sheets_engine
+from fetch_scheduler import FetchScheduler
+from worksheet_history import WorksheetHistory, longest_first
+
+# Shared work queue for extracting one manifest on several machines.
+# The queue is a SQLite file on a volume every worker can reach; each task is
+# one worksheet (spreadsheet_id, gid, schema) and moves
+#   pending -> leased -> done | (back to pending) -> ... -> failed
+# A worker leases the next task for --lease seconds and renews the lease while
+# it works, so a crashed or stalled worker's task is taken over once its lease
+# runs out. A task that fails (HTTP errors after the scheduler's retries, a
+# missing header row) goes back to pending after a short delay for any worker,
+# so one throttled IP slows down only its own share; after MAX_ATTEMPTS it is
+# marked failed. The same limit applies to leases that ran out, so a worksheet
+# that crashes every worker taking it is not handed out forever. Each worker
+# has its own session and fetch scheduler.
+#
+# Results land in work_queue_cache/ next to the queue file, one JSON file of
+# extracted records per worksheet. load_outputs() groups them back into the
+# per-spreadsheet output files, which is what the merger reads when its
+# work_queue_path is set; only outputs with every worksheet done are returned,
+# the merger reads the others from disk. Validation stays in the merger, as
+# for files.
+#
+# SQLite locking needs a filesystem with working POSIX locks; plain NFS
+# mounts without a lock daemon are not safe for several writers.
+#
+#   python work_queue.py enqueue --queue Q.db [--reset] [--history worksheet_history.json]
+#   python work_queue.py work --queue Q.db          (one per machine/process)
+#   python work_queue.py status --queue Q.db
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_QUEUE = os.path.join(SCRIPT_DIR, "work_queue.db")
+CACHE_DIRNAME = "work_queue_cache"
+
+LEASE_SECONDS = 120
+MAX_ATTEMPTS = 4
+RETRY_DELAY = 5.0
+POLL_SECONDS = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    spreadsheet_id TEXT NOT NULL,
+    gid TEXT NOT NULL,
+    schema TEXT NOT NULL,
+    output TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_until REAL NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    rows INTEGER,
+    content_hash TEXT,
+    error TEXT,
+    finished_at REAL,
+    UNIQUE (spreadsheet_id, gid, schema)
+)
+"""
+
+
+def connect(path):
+    connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute(SCHEMA)
+    return connection
+
+
+def cache_dir(queue_path):
+    return os.path.join(os.path.dirname(os.path.abspath(queue_path)), CACHE_DIRNAME)
+
+
+def enqueue(queue_path, manifest, reset=False, history=None):
+    # Tasks are ordered longest-first when a worksheet history is given
+    worksheets = [
+        (sheet["spreadsheet_id"], gid, sheet.get("schema", "roster"), sheet["output"])
+        for sheet in manifest["spreadsheets"] for gid in sheet["gids"]
+    ]
+    if history is not None:
+        estimates = [history.estimate(spreadsheet_id, gid) for spreadsheet_id, gid, _, _ in worksheets]
+        positions = {index: rank for rank, index in enumerate(longest_first(estimates))}
+    else:
+        positions = {index: index for index in range(len(worksheets))}
+
+    db = connect(queue_path)
+    db.execute("BEGIN IMMEDIATE")
+    if reset:
+        db.execute("UPDATE tasks SET state = 'pending', owner = NULL, lease_until = 0, available_at = 0, "
+                   "attempts = 0, error = NULL")
+    added = 0
+    for index, (spreadsheet_id, gid, schema_name, output) in enumerate(worksheets):
+        cursor = db.execute(
+            "INSERT OR IGNORE INTO tasks (spreadsheet_id, gid, schema, output, position) VALUES (?, ?, ?, ?, ?)",
+            (spreadsheet_id, gid, schema_name, output, positions[index]),
+        )
+        added += cursor.rowcount
+        db.execute("UPDATE tasks SET output = ?, position = ? WHERE spreadsheet_id = ? AND gid = ? AND schema = ?",
+                   (output, positions[index], spreadsheet_id, gid, schema_name))
+    db.execute("COMMIT")
+    db.close()
+    return added
+
+
+def lease(db, owner, seconds=LEASE_SECONDS):
+    # Next pending task, or one whose lease has run out; None when nothing is ready
+    now = time.time()
+    db.execute("BEGIN IMMEDIATE")
+    # A worksheet that keeps killing or stalling its worker never reaches fail()
+    db.execute("UPDATE tasks SET state = 'failed', owner = NULL, error = 'lease expired' "
+               "WHERE state = 'leased' AND lease_until < ? AND attempts >= ?", (now, MAX_ATTEMPTS))
+    row = db.execute(
+        "SELECT * FROM tasks WHERE (state = 'pending' AND available_at <= ?) "
+        "OR (state = 'leased' AND lease_until < ?) ORDER BY position LIMIT 1",
+        (now, now),
+    ).fetchone()
+    if row is not None:
+        db.execute("UPDATE tasks SET state = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1 "
+                   "WHERE id = ?", (owner, now + seconds, row["id"]))
+    db.execute("COMMIT")
+    return row
+
+
+def renew(db, task_id, owner, seconds=LEASE_SECONDS):
+    cursor = db.execute("UPDATE tasks SET lease_until = ? WHERE id = ? AND owner = ? AND state = 'leased'",
+                        (time.time() + seconds, task_id, owner))
+    return cursor.rowcount == 1
+
+
+def complete(db, task_id, result, rows, body_hash):
+    # Accepted from whoever finishes first; a duplicate run writes the same file
+    db.execute("UPDATE tasks SET state = 'done', result = ?, rows = ?, content_hash = ?, error = NULL, "
+               "finished_at = ? WHERE id = ? AND state != 'done'",
+               (result, rows, body_hash, time.time(), task_id))
+
+
+def fail(db, task_id, owner, error):
+    db.execute("UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+               "owner = NULL, available_at = ?, error = ? WHERE id = ? AND owner = ? AND state = 'leased'",
+               (MAX_ATTEMPTS, time.time() + RETRY_DELAY, error, task_id, owner))
+
+
+def remaining(db):
+    row = db.execute("SELECT COUNT(*) FROM tasks WHERE state IN ('pending', 'leased')").fetchone()
+    return row[0]
+
+
+def counts(db):
+    return {row["state"]: row["n"] for row in db.execute("SELECT state, COUNT(*) AS n FROM tasks GROUP BY state")}
+
+
+class LeaseKeeper:
+    # Renews a task's lease from a background thread while it is being worked on
+    def __init__(self, queue_path, task_id, owner, seconds):
+        self.stop = threading.Event()
+        self.thread = threading.Thread(
+            target=self._run, args=(queue_path, task_id, owner, seconds), daemon=True
+        )
+
+    def _run(self, queue_path, task_id, owner, seconds):
+        db = connect(queue_path)
+        while not self.stop.wait(seconds / 3):
+            if not renew(db, task_id, owner, seconds):
+                break
+        db.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+
+
+def _write_result(directory, task, records):
+    name = "__".join("".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in str(part))
+                     for part in (task["spreadsheet_id"], task["gid"], task["schema"])) + ".json"
+    path = os.path.join(directory, name)
+    part_path = f"{path}.{os.getpid()}.part"
+    with open(part_path, "w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False)
+    os.replace(part_path, path)
+    return name
+
+
+def work(queue_path, owner, options=None, lease_seconds=LEASE_SECONDS, schemas=sheets_engine.SCHEMAS):
+    options = dict(sheets_engine.DEFAULT_OPTIONS, **(options or {}))
+    directory = cache_dir(queue_path)
+    os.makedirs(directory, exist_ok=True)
+    db = connect(queue_path)
+    session = requests.Session()
+    if options["scheduler"]:
+        session = FetchScheduler(options["rate"], maximum=options["max_concurrency"]).session(session)
+    layouts = {}
+    done = failed = 0
+
+    while True:
+        task = lease(db, owner, lease_seconds)
+        if task is None:
+            if not remaining(db):
+                break
+            # Others hold the rest; wait in case a lease runs out
+            time.sleep(POLL_SECONDS)
+            continue
+
+        spreadsheet_id, gid, schema_name = task["spreadsheet_id"], task["gid"], task["schema"]
+        print(f"📥 [{owner}] {spreadsheet_id} gid {gid} (attempt {task['attempts'] + 1})")
+        stats = sheets_engine.new_run_stats()
+        fetched = {}
+        try:
+            with LeaseKeeper(queue_path, task["id"], owner, lease_seconds):
+                records = sheets_engine.extract_worksheet(
+                    session, spreadsheet_id, gid, schema_name, schemas[schema_name], stats, layouts, options,
+                    fetched=fetched,
+                )
+            if records is None:
+                raise RuntimeError("download failed")
+        except Exception as e:
+            print(f"⚠️ [{owner}] {spreadsheet_id} gid {gid}: {e}")
+            fail(db, task["id"], owner, str(e))
+            failed += 1
+            continue
+        result = _write_result(directory, task, records)
+        complete(db, task["id"], result, len(records), fetched.get("content_hash"))
+        done += 1
+        print(f"   → [{owner}] {len(records)} rows")
+
+    db.close()
+    return done, failed
+
+
+def load_outputs(queue_path):
+    # {output filename: records} for outputs whose every worksheet is done, in
+    # manifest order; an output with a pending, leased or failed worksheet is
+    # left out, so the merger reads that spreadsheet's file instead
+    db = connect(queue_path)
+    rows = db.execute(
+        "SELECT * FROM tasks WHERE output IN "
+        "(SELECT output FROM tasks GROUP BY output HAVING SUM(state != 'done') = 0) ORDER BY output, id"
+    ).fetchall()
+    db.close()
+    directory = cache_dir(queue_path)
+    outputs = {}
+    for row in rows:
+        with open(os.path.join(directory, row["result"]), "r", encoding="utf-8") as f:
+            records = json.load(f)
+        for entry in records:
+            entry["_worksheet_gid"] = row["gid"]
+        outputs.setdefault(row["output"], []).extend(records)
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared worksheet queue for extraction on several machines.")
+    parser.add_argument("command", choices=["enqueue", "work", "status"])
+    parser.add_argument("--queue", default=DEFAULT_QUEUE)
+    parser.add_argument("--manifest", default=sheets_engine.DEFAULT_MANIFEST)
+    parser.add_argument("--reset", action="store_true", help="enqueue: queue every worksheet again")
+    parser.add_argument("--history", help="enqueue: worksheet_history.json to order tasks longest-first")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}")
+    parser.add_argument("--lease", type=float, default=LEASE_SECONDS, help="work: lease length in seconds")
+    parser.add_argument("--rate", type=float, default=0.0, help="work: requests per second for this worker")
+    parser.add_argument("--base-url", help="work: override the Google Sheets host, e.g. a local fake server")
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        history = WorksheetHistory(args.history) if args.history else None
+        added = enqueue(args.queue, sheets_engine.load_manifest(args.manifest), args.reset, history)
+        print(f"✅ {added} new tasks queued in {args.queue}")
+    elif args.command == "work":
+        if args.base_url:
+            sheets_engine.SHEETS_BASE_URL = args.base_url.rstrip("/")
+        done, failed = work(args.queue, args.worker_id, {"rate": args.rate}, args.lease)
+        print(f"✅ [{args.worker_id}] {done} worksheets done, {failed} failed attempts")
+    db = connect(args.queue)
+    print("📊 " + ", ".join(f"{state}: {n}" for state, n in sorted(counts(db).items())))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import heapq
+import json
+import os
+
+# Per-worksheet history of past runs, used to start the big worksheets first.
+# Each finished download updates a moving average of its bytes, rows and
+# seconds (fetch + parse) under "spreadsheet_id:gid". With several workers,
+# starting the longest jobs first (LPT) keeps one slow worksheet from being
+# picked up last and running alone at the end. Worksheets never seen before
+# are estimated at the average of the known ones.
+# predict_makespan() replays an order on `workers` identical workers, so a
+# run can print its predicted wall time next to the actual one.
+
+HISTORY_FILENAME = "worksheet_history.json"
+SMOOTHING = 0.5  # weight of the newest run in the moving averages
+DEFAULT_SECONDS = 1.0
+
+
+class WorksheetHistory:
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def record(self, spreadsheet_id, gid, size, rows, seconds):
+        key = f"{spreadsheet_id}:{gid}"
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = {"bytes": size, "rows": rows, "seconds": seconds, "runs": 0}
+        else:
+            for field, value in (("bytes", size), ("rows", rows), ("seconds", seconds)):
+                entry[field] = round(entry[field] + SMOOTHING * (value - entry[field]), 4)
+        entry["runs"] += 1
+        self.dirty = True
+
+    def estimate(self, spreadsheet_id, gid):
+        entry = self.entries.get(f"{spreadsheet_id}:{gid}")
+        if entry is not None:
+            return entry["seconds"]
+        if not self.entries:
+            return DEFAULT_SECONDS
+        return sum(e["seconds"] for e in self.entries.values()) / len(self.entries)
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        self.dirty = False
+
+
+def longest_first(estimates):
+    # Indexes of estimates, longest first; equal estimates keep their order
+    return sorted(range(len(estimates)), key=lambda i: -estimates[i])
+
+
+def predict_makespan(durations, workers):
+    # Greedy list scheduling: each job goes to the worker that frees up first
+    finish = [0.0] * max(1, workers)
+    for duration in durations:
+        heapq.heappush(finish, heapq.heappop(finish) + duration)
+    return max(finish)